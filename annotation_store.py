@@ -0,0 +1,343 @@
+from collections.abc import ItemsView, Mapping
+
+import numpy as np
+
+# Columnar storage for the annotations file:
+# - 'records': one structured array holding every bounding box, sorted by frame.
+# - 'frame_keys' / 'frame_offsets': per-frame offset index into 'records'.
+# - 'cow_index' / 'cow_keys' / 'cow_offsets': per-cow offset index into 'records'.
+# - 'nearest': the nearest bounding box of each cow per frame, sorted by (cow_tag, frame).
+# The dictionary-like views below expose the lookups the GUI used on the old nested dicts.
+
+ANNOTATION_DTYPE = np.dtype(
+    [
+        ("frame", np.int32),
+        ("cow_tag", np.int32),
+        ("x", np.int32),
+        ("y", np.int32),
+        ("w", np.int32),
+        ("h", np.int32),
+        ("camera", np.int32),
+    ]
+)
+
+NEAREST_BBOX_DTYPE = np.dtype(
+    [
+        ("cow_tag", np.int32),
+        ("frame", np.int32),
+        ("distance", np.float64),
+        ("x", np.int32),
+        ("y", np.int32),
+        ("w", np.int32),
+        ("h", np.int32),
+    ]
+)
+
+
+def parse_annotation_rows(source):
+    """
+    Parse annotation lines into a structured array.
+
+    Parameters:
+    - source: str or list, path to the annotations file, or its lines
+
+    Returns:
+    - records: np.ndarray, ANNOTATION_DTYPE rows in file order
+    """
+    values = np.loadtxt(source, delimiter=",", usecols=range(7), ndmin=2)
+    records = np.empty(len(values), dtype=ANNOTATION_DTYPE)
+    # Assigning the float columns truncates toward zero, like int(float(value))
+    for column, name in enumerate(ANNOTATION_DTYPE.names):
+        records[name] = values[:, column]
+    return records
+
+
+def build_offsets(keys):
+    """
+    Build an offset index over a sorted key column.
+
+    Parameters:
+    - keys: np.ndarray, sorted key column
+
+    Returns:
+    - unique_keys: np.ndarray, the distinct keys in order
+    - offsets: np.ndarray, rows of unique_keys[i] are offsets[i]:offsets[i + 1]
+    """
+    if len(keys) == 0:
+        return keys[:0].copy(), np.zeros(1, dtype=np.int64)
+    starts = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    unique_keys = keys[np.concatenate(([0], starts))]
+    offsets = np.concatenate(([0], starts, [len(keys)])).astype(np.int64)
+    return unique_keys, offsets
+
+
+def find_key(keys, key):
+    """
+    Find the position of a key in a sorted key column.
+
+    Parameters:
+    - keys: np.ndarray, sorted key column
+    - key: number, the key to look for
+
+    Returns:
+    - index: int, position of the key, or -1 if it is missing
+    """
+    try:
+        key = int(key)
+    except (TypeError, ValueError):
+        return -1
+    index = int(np.searchsorted(keys, key))
+    if index < len(keys) and keys[index] == key:
+        return index
+    return -1
+
+
+class AnnotationStore:
+    # Arrays that fully describe a store, e.g. for the parse cache
+    ARRAY_NAMES = (
+        "records",
+        "frame_keys",
+        "frame_offsets",
+        "cow_index",
+        "cow_keys",
+        "cow_offsets",
+        "nearest",
+        "nearest_cow_keys",
+        "nearest_cow_offsets",
+    )
+
+    def __init__(self, arrays):
+        """
+        Wrap prebuilt store arrays.
+
+        Parameters:
+        - arrays: dict, one np.ndarray per name in ARRAY_NAMES
+        """
+        for name in self.ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+
+        self.annotations = FrameAnnotationsView(self)
+        self.individual_cow_annotations = CowAnnotationsView(self)
+        self.nearest_bbox_per_cow = NearestBboxView(self)
+
+    @classmethod
+    def build(cls, records, nearest):
+        """
+        Build the offset indexes over parsed annotations.
+
+        Parameters:
+        - records: np.ndarray, ANNOTATION_DTYPE rows in file order
+        - nearest: np.ndarray, NEAREST_BBOX_DTYPE rows
+
+        Returns:
+        - store: AnnotationStore
+        """
+        arrays = {}
+        frame_order = np.argsort(records["frame"], kind="stable")
+        arrays["records"] = records[frame_order]
+        arrays["frame_keys"], arrays["frame_offsets"] = build_offsets(
+            arrays["records"]["frame"]
+        )
+
+        # Rows of each cow in file order, as the old per-cow lists were built
+        sorted_row = np.empty_like(frame_order)
+        sorted_row[frame_order] = np.arange(len(frame_order))
+        arrays["cow_index"] = sorted_row[
+            np.argsort(records["cow_tag"], kind="stable")
+        ]
+        arrays["cow_keys"], arrays["cow_offsets"] = build_offsets(
+            arrays["records"]["cow_tag"][arrays["cow_index"]]
+        )
+
+        arrays["nearest"] = nearest[
+            np.lexsort((nearest["frame"], nearest["cow_tag"]))
+        ]
+        arrays["nearest_cow_keys"], arrays["nearest_cow_offsets"] = build_offsets(
+            arrays["nearest"]["cow_tag"]
+        )
+        return cls(arrays)
+
+    def to_arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+
+    def frame_boxes(self, frame):
+        """
+        Get the bounding boxes of a frame.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - boxes: np.ndarray, ANNOTATION_DTYPE rows in file order (empty if none)
+        """
+        index = find_key(self.frame_keys, frame)
+        if index < 0:
+            return self.records[:0]
+        return self.records[self.frame_offsets[index] : self.frame_offsets[index + 1]]
+
+    def cow_boxes(self, cow_tag):
+        """
+        Get every bounding box of a cow across the whole video.
+
+        Parameters:
+        - cow_tag: int, the cow tag
+
+        Returns:
+        - boxes: np.ndarray, ANNOTATION_DTYPE rows in file order (empty if none)
+        """
+        index = find_key(self.cow_keys, cow_tag)
+        if index < 0:
+            return self.records[:0]
+        rows = self.cow_index[self.cow_offsets[index] : self.cow_offsets[index + 1]]
+        return self.records[rows]
+
+    def has_cow(self, cow_tag):
+        return find_key(self.cow_keys, cow_tag) >= 0
+
+    def nearest_track(self, cow_tag):
+        """
+        Get the nearest-bbox track of a cow.
+
+        Parameters:
+        - cow_tag: int, the cow tag
+
+        Returns:
+        - track: np.ndarray, NEAREST_BBOX_DTYPE rows sorted by frame (empty if none)
+        """
+        index = find_key(self.nearest_cow_keys, cow_tag)
+        if index < 0:
+            return self.nearest[:0]
+        return self.nearest[
+            self.nearest_cow_offsets[index] : self.nearest_cow_offsets[index + 1]
+        ]
+
+
+class FrameAnnotationsView(Mapping):
+    """frame -> [(cow_tag, x, y, w, h, camera_num), ...]"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, frame):
+        if find_key(self.store.frame_keys, frame) < 0:
+            raise KeyError(frame)
+        boxes = self.store.frame_boxes(frame)
+        return list(
+            zip(
+                boxes["cow_tag"].tolist(),
+                boxes["x"].tolist(),
+                boxes["y"].tolist(),
+                boxes["w"].tolist(),
+                boxes["h"].tolist(),
+                boxes["camera"].tolist(),
+            )
+        )
+
+    def __contains__(self, frame):
+        return find_key(self.store.frame_keys, frame) >= 0
+
+    def __iter__(self):
+        return iter(self.store.frame_keys.tolist())
+
+    def __len__(self):
+        return len(self.store.frame_keys)
+
+
+class CowAnnotationsView(Mapping):
+    """cow_tag -> [(frame, x, y, w, h, camera_num, transform_dimensions), ...]"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, cow_tag):
+        if not self.store.has_cow(cow_tag):
+            raise KeyError(cow_tag)
+        boxes = self.store.cow_boxes(cow_tag)
+        # transform_dimensions is 0 for landscape boxes and 1 otherwise
+        transform_dimensions = (boxes["w"] <= boxes["h"]).astype(np.int32)
+        return list(
+            zip(
+                boxes["frame"].tolist(),
+                boxes["x"].tolist(),
+                boxes["y"].tolist(),
+                boxes["w"].tolist(),
+                boxes["h"].tolist(),
+                boxes["camera"].tolist(),
+                transform_dimensions.tolist(),
+            )
+        )
+
+    def __contains__(self, cow_tag):
+        return self.store.has_cow(cow_tag)
+
+    def __iter__(self):
+        return iter(self.store.cow_keys.tolist())
+
+    def __len__(self):
+        return len(self.store.cow_keys)
+
+
+class NearestBboxView(Mapping):
+    """cow_tag -> {frame: (distance, (x, y, w, h))}"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, cow_tag):
+        if find_key(self.store.nearest_cow_keys, cow_tag) < 0:
+            raise KeyError(cow_tag)
+        return NearestTrackView(self.store.nearest_track(cow_tag))
+
+    def __contains__(self, cow_tag):
+        return find_key(self.store.nearest_cow_keys, cow_tag) >= 0
+
+    def __iter__(self):
+        return iter(self.store.nearest_cow_keys.tolist())
+
+    def __len__(self):
+        return len(self.store.nearest_cow_keys)
+
+
+class NearestTrackView(Mapping):
+    """frame -> (distance, (x, y, w, h)) for a single cow, in frame order"""
+
+    def __init__(self, track):
+        self.track = track
+
+    def __getitem__(self, frame):
+        index = find_key(self.track["frame"], frame)
+        if index < 0:
+            raise KeyError(frame)
+        row = self.track[index]
+        return (
+            float(row["distance"]),
+            (int(row["x"]), int(row["y"]), int(row["w"]), int(row["h"])),
+        )
+
+    def __contains__(self, frame):
+        return find_key(self.track["frame"], frame) >= 0
+
+    def __iter__(self):
+        return iter(self.track["frame"].tolist())
+
+    def __len__(self):
+        return len(self.track)
+
+    def items(self):
+        return NearestTrackItemsView(self)
+
+
+class NearestTrackItemsView(ItemsView):
+    def __iter__(self):
+        # Convert whole columns at once instead of one searchsorted per frame
+        track = self._mapping.track
+        bboxes = zip(
+            track["x"].tolist(),
+            track["y"].tolist(),
+            track["w"].tolist(),
+            track["h"].tolist(),
+        )
+        return zip(
+            track["frame"].tolist(),
+            zip(track["distance"].tolist(), bboxes),
+        )
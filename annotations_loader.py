@@ -1,108 +1,325 @@
+import argparse
+import time
+
 import numpy as np
 
-# Load annotations data from the specified file into dictionaries:
-# - 'annotations': Dictionary with frames as keys and lists of cow annotations as values.
-# - 'individual_cow_annotations': Dictionary with cow tags as keys and lists of annotations including transformed dimensions.
-# - 'individual_identification_annotations': Dictionary with frames as keys and lists of cow annotations as values.
+from annotation_store import (
+    ANNOTATION_DTYPE,
+    NEAREST_BBOX_DTYPE,
+    AnnotationStore,
+    build_offsets,
+)
+from chunked_parser import ROW_PARSERS, ChunkedParser
+from identification_store import IdentificationStore, LazyIdentificationStore
+
+# Load annotations data from the specified file:
+# - 'annotations': columnar AnnotationStore; its views map frames and cow tags to lists of cow annotations.
+# - 'nearest_bbox_per_cow': the nearest bounding box of each cow per frame, following the cow's track.
+# - 'individual_identification_annotations': columnar IdentificationStore mapping frames to lists of identification rows.
+# A ParseCache, when given, keeps the parsed arrays on disk between launches.
 
 
 class AnnotationsLoader:
-    def __init__(self):
-        pass
+    def __init__(self, parse_cache=None, parse_workers=1):
+        # Optional ParseCache; without it every file is parsed from text
+        self.parse_cache = parse_cache
+        # More than one worker parses large files with a ChunkedParser
+        self.parse_workers = parse_workers
 
-    def load_annotations(self, file_path):
+    def parse_annotation_file(self, file_path):
         """
-        Load annotations from a given file.
+        Parse the annotations file into a structured array.
 
         Parameters:
         - file_path: str, path to the annotations file
 
         Returns:
-        - annotations: dict, dictionary of annotations
-        - individual_cow_annotations: dict, dictionary of annotations
-        """
-        with open(file_path, "r") as file:
-            lines = file.readlines()
-
-        annotations = {}
-        individual_cow_annotations = {}
-        for line in lines:
-            values = line.strip().split(",")
-            frame, cow_tag, x, y, w, h, camera_num = map(float, values[:7])
-            frame = int(frame)
-            # annotations
-            if frame not in annotations:
-                annotations[frame] = []
-            annotations[frame].append(
-                (int(cow_tag), int(x), int(y), int(w), int(h), int(camera_num))
-            )
-            # individual_cow_annotations
-            if cow_tag not in individual_cow_annotations:
-                individual_cow_annotations[cow_tag] = []
-            if w > h:
-                transform_dimensions = 0
+        - records: np.ndarray, ANNOTATION_DTYPE rows in file order
+        """
+        return self.parse_text_file(file_path, "annotations")
+
+    def parse_text_file(self, file_path, kind):
+        """
+        Parse a text file with the configured parser backend.
+
+        Parameters:
+        - file_path: str, path to the text file
+        - kind: str, "annotations" or "identification"
+
+        Returns:
+        - rows: np.ndarray, parsed rows in file order
+        """
+        if self.parse_workers > 1:
+            return ChunkedParser(self.parse_workers).parse(file_path, kind)
+        return ROW_PARSERS[kind](file_path)
+
+    def linking_order(self, records):
+        """
+        Order boxes by cow, then like the (frame, x, y, w, h) tuples of each cow.
+
+        Boxes that only differ in camera are interchangeable for the linking,
+        so the camera is not part of the order.
+
+        Parameters:
+        - records: np.ndarray, ANNOTATION_DTYPE rows
+
+        Returns:
+        - order: np.ndarray, row indices in linking order
+        - group_key: np.ndarray, (cow_tag, frame) key of each row in that order
+        """
+        cow_tag = records["cow_tag"].astype(np.int64)
+        frame = records["frame"].astype(np.int64)
+        if len(records) == 0:
+            return np.zeros(0, dtype=np.int64), frame
+        frame_range = int(frame.max() - frame.min()) + 1
+        group_key = (cow_tag - cow_tag.min()) * frame_range + (frame - frame.min())
+        order = np.argsort(group_key, kind="stable")
+        group_key = group_key[order]
+
+        # Only frames with several candidates need their boxes ordered
+        _, offsets = build_offsets(group_key)
+        sizes = np.diff(offsets)
+        rows = np.flatnonzero(np.repeat(sizes > 1, sizes))
+        if len(rows):
+            candidates = order[rows]
+            keys = group_key[rows]
+            group_rank = np.concatenate(([0], np.cumsum(keys[1:] != keys[:-1])))
+            columns = [group_rank] + [
+                records[name][candidates] for name in ("x", "y", "w", "h")
+            ]
+            packed = self.pack_sort_key(columns)
+            if packed is not None:
+                candidate_order = np.argsort(packed, kind="stable")
             else:
-                transform_dimensions = 1
-
-            individual_cow_annotations[cow_tag].append(
-                (
-                    int(frame),
-                    int(x),
-                    int(y),
-                    int(w),
-                    int(h),
-                    int(camera_num),
-                    transform_dimensions,
-                )
+                candidate_order = np.lexsort(columns[::-1])
+            order[rows] = candidates[candidate_order]
+        return order, group_key
+
+    def pack_sort_key(self, columns):
+        """
+        Pack integer columns into one int64 key that sorts like their tuples.
+
+        Parameters:
+        - columns: list of np.ndarray, most significant column first
+
+        Returns:
+        - key: np.ndarray, int64 key per row, or None if it does not fit in 63 bits
+        """
+        key = np.zeros(len(columns[0]), dtype=np.int64)
+        used_bits = 0
+        for column in columns:
+            column = column.astype(np.int64)
+            column -= column.min()
+            bits = int(column.max()).bit_length()
+            used_bits += bits
+            if used_bits > 63:
+                return None
+            key = (key << bits) | column
+        return key
+
+    def link_nearest_bboxes(self, records):
+        """
+        Select one bounding box per cow and frame, following the cow's track.
+
+        The first box of a cow is kept as is. In every later frame, the box
+        closest to the box selected in the previous frame is kept, ties going
+        to the first box in sorted order. Frames with a single candidate need
+        no choice. In the others, the box chosen for each box of the previous
+        frame is found for all frames at once, and the chains of choices are
+        followed by pointer doubling.
+
+        Parameters:
+        - records: np.ndarray, ANNOTATION_DTYPE rows
+
+        Returns:
+        - nearest: np.ndarray, NEAREST_BBOX_DTYPE rows sorted by (cow_tag, frame)
+        """
+        order, group_key = self.linking_order(records)
+        if len(order) == 0:
+            return np.empty(0, dtype=NEAREST_BBOX_DTYPE)
+        x = records["x"][order].astype(np.float64)
+        y = records["y"][order].astype(np.float64)
+
+        # Group the candidates by (cow, frame)
+        _, offsets = build_offsets(group_key)
+        starts = offsets[:-1]
+        sizes = np.diff(offsets)
+        group_cow_tag = records["cow_tag"][order[starts]]
+        cow_first = np.ones(len(starts), dtype=bool)
+        cow_first[1:] = group_cow_tag[1:] != group_cow_tag[:-1]
+
+        # A cow's first frame keeps its first box and single-candidate frames
+        # have no choice; everything else depends on the previous frame
+        selected = starts.copy()
+        pending = np.flatnonzero((sizes > 1) & ~cow_first)
+        if len(pending):
+            # Box chosen in each pending frame for each box of the frame before
+            # it: one (previous box, candidate) pair per combination
+            previous_sizes = sizes[pending - 1]
+            counts = sizes[pending]
+            pair_group = np.repeat(
+                np.arange(len(pending)), previous_sizes * counts
+            )
+            pair_offsets = np.concatenate(
+                ([0], np.cumsum(previous_sizes * counts)[:-1])
+            )
+            pair_local = np.arange(len(pair_group)) - pair_offsets[pair_group]
+            pair_counts = counts[pair_group]
+            local = pair_local % pair_counts
+            previous = starts[pending - 1][pair_group] + pair_local // pair_counts
+            candidates = starts[pending][pair_group] + local
+            distance = np.sqrt(
+                (x[candidates] - x[previous]) ** 2 + (y[candidates] - y[previous]) ** 2
             )
-        # Find the largest bounding box for each cow
-        # largest_bbox_per_cow = (
-        #     {}
-        # )  # Dictionary to store largest bounding box for each cow
-
-        # for cow_tag, info_annotations in individual_cow_annotations.items():
-        #     largest_bbox = {}  # Dictionary to store largest bounding box for each frame
-        #     for annotation in info_annotations:
-        #         frame, x, y, w, h, _, _ = annotation
-        #         size = w * h
-        #         if frame not in largest_bbox or size > largest_bbox[frame][0]:
-        #             largest_bbox[frame] = (size, (x, y, w, h))
-
-        #     largest_bbox_per_cow[cow_tag] = largest_bbox
-
-        nearest_bbox_per_cow = (
-            {}
-        )  # Dictionary to store nearest bounding box for each cow
-
-        for cow_tag, info_annotations in individual_cow_annotations.items():
-            nearest_bbox = {}  # Dictionary to store nearest bounding box for each frame
-            prev_bbox = None  # Store the previous selected bounding box
-            for annotation in sorted(info_annotations):
-                frame, x, y, w, h, _, _ = annotation
-                bbox = (x, y, w, h)
-                if prev_bbox is None:  # first frame
-                    nearest_bbox[frame] = (0, bbox)  # distance is 0 for the first frame
-                    prev_bbox = 0, x, y, w, h  # update the previous bounding box
-                    current_bbox = 0, x, y, w, h
-                else:
-                    if current_bbox[0] != frame:
-                        prev_bbox = current_bbox
-                    distance = np.sqrt(
-                        (x - prev_bbox[1]) ** 2 + (y - prev_bbox[2]) ** 2
-                    )
-                    if frame not in nearest_bbox or distance < nearest_bbox[frame][0]:
-                        nearest_bbox[frame] = (distance, bbox)
-                        current_bbox = (
-                            int(frame),
-                            int(x),
-                            int(y),
-                            int(w),
-                            int(h),
-                        )  # update the previous bounding box only if it is selected
-
-            nearest_bbox_per_cow[cow_tag] = nearest_bbox
-
-        return (annotations, individual_cow_annotations, nearest_bbox_per_cow)
+            # One segment per previous box; ties go to the first candidate
+            segments = np.flatnonzero(local == 0)
+            best = np.minimum.reduceat(distance, segments)
+            first_best = np.where(
+                distance == np.repeat(best, counts[pair_group[segments]]),
+                local,
+                len(order),
+            )
+            jump = np.arange(len(order))
+            jump[previous[segments]] = candidates[segments] + np.minimum.reduceat(
+                first_best, segments
+            )
+
+            # A run of pending frames starts from the fixed box of the frame
+            # before it; the box of its k-th frame is k jumps away, taken by
+            # pointer doubling in log2(run length) rounds for every cow at once
+            run_start = np.ones(len(pending), dtype=bool)
+            run_start[1:] = pending[1:] != pending[:-1] + 1
+            index = np.arange(len(pending))
+            first = np.maximum.accumulate(np.where(run_start, index, 0))
+            steps = index - first + 1
+            box = starts[pending[first] - 1]
+            while True:
+                odd = (steps & 1).astype(bool)
+                box[odd] = jump[box[odd]]
+                steps >>= 1
+                if not steps.any():
+                    break
+                jump = jump[jump]
+            selected[pending] = box
+
+        # Distance of every selected box to the one selected in the previous frame
+        distance = np.zeros(len(starts))
+        later = np.flatnonzero(~cow_first)
+        current, previous = selected[later], selected[later - 1]
+        distance[later] = np.sqrt(
+            (x[current] - x[previous]) ** 2 + (y[current] - y[previous]) ** 2
+        )
+
+        rows = order[selected]
+        nearest = np.empty(len(starts), dtype=NEAREST_BBOX_DTYPE)
+        nearest["cow_tag"] = group_cow_tag
+        nearest["frame"] = records["frame"][rows]
+        nearest["distance"] = distance
+        for name in ("x", "y", "w", "h"):
+            nearest[name] = records[name][rows]
+        return nearest
+
+    def link_nearest_bboxes_greedy(self, records):
+        """
+        Reference implementation of link_nearest_bboxes, one box at a time.
+
+        Parameters:
+        - records: np.ndarray, ANNOTATION_DTYPE rows
+
+        Returns:
+        - nearest: np.ndarray, NEAREST_BBOX_DTYPE rows sorted by (cow_tag, frame)
+        """
+        # Same order as sorting the (frame, x, y, w, h, camera) tuples of each cow
+        order = np.lexsort(
+            (
+                records["camera"],
+                records["h"],
+                records["w"],
+                records["y"],
+                records["x"],
+                records["frame"],
+                records["cow_tag"],
+            )
+        )
+        rows = records[order][["cow_tag", "frame", "x", "y", "w", "h"]].tolist()
+
+        nearest_bbox = {}  # Dictionary to store nearest bounding box per (cow, frame)
+        prev_cow_tag = None
+        for cow_tag, frame, x, y, w, h in rows:
+            if cow_tag != prev_cow_tag:  # first frame of this cow
+                nearest_bbox[(cow_tag, frame)] = (0, x, y, w, h)
+                prev_bbox = 0, x, y, w, h  # update the previous bounding box
+                current_bbox = 0, x, y, w, h
+                prev_cow_tag = cow_tag
+                continue
+            if current_bbox[0] != frame:
+                prev_bbox = current_bbox
+            distance = np.sqrt((x - prev_bbox[1]) ** 2 + (y - prev_bbox[2]) ** 2)
+            key = (cow_tag, frame)
+            if key not in nearest_bbox or distance < nearest_bbox[key][0]:
+                nearest_bbox[key] = (distance, x, y, w, h)
+                # update the previous bounding box only if it is selected
+                current_bbox = (frame, x, y, w, h)
+
+        return np.array(
+            [
+                (cow_tag, frame) + selected
+                for (cow_tag, frame), selected in nearest_bbox.items()
+            ],
+            dtype=NEAREST_BBOX_DTYPE,
+        )
+
+    def load_annotation_store(self, file_path):
+        """
+        Load annotations from a given file into a columnar store.
+
+        Parameters:
+        - file_path: str, path to the annotations file
+
+        Returns:
+        - store: AnnotationStore, boxes plus per-frame and per-cow indexes
+        """
+
+        def build():
+            records = self.parse_annotation_file(file_path)
+            return AnnotationStore.build(
+                records, self.link_nearest_bboxes(records)
+            ).to_arrays()
+
+        if self.parse_cache is None:
+            return AnnotationStore(build())
+        return AnnotationStore(self.parse_cache.load(file_path, "annotations", build))
+
+    def load_annotations(self, file_path):
+        """
+        Load annotations from a given file.
+
+        Parameters:
+        - file_path: str, path to the annotations file
+
+        Returns:
+        - annotations: FrameAnnotationsView, annotations per frame
+        - individual_cow_annotations: CowAnnotationsView, annotations per cow
+        - nearest_bbox_per_cow: NearestBboxView, nearest bounding box per cow and frame
+        """
+        store = self.load_annotation_store(file_path)
+        return (
+            store.annotations,
+            store.individual_cow_annotations,
+            store.nearest_bbox_per_cow,
+        )
+
+    def parse_identification_file(self, file_path):
+        """
+        Parse the identification results file into a structured array.
+
+        Parameters:
+        - file_path: str, path to the identification results file
+
+        Returns:
+        - rows: np.ndarray, IDENTIFICATION_DTYPE rows in file order
+        """
+        return self.parse_text_file(file_path, "identification")
 
     def load_individual_identification_annotations(self, file_path):
         """
@@ -112,47 +329,124 @@ class AnnotationsLoader:
         - file_path: str, path to the annotations file
 
         Returns:
-        - data : list, list of annotations
+        - data : IdentificationStore, identification rows per frame
         """
-        with open(file_path, "r") as file:
-            lines = file.readlines()
 
-        annotations = {}
-        for line in lines:
-            values = line.strip().split(",")
-            (
-                frame,
-                cow_tag,
-                query_x,
-                query_y,
-                query_w,
-                query_h,
-                cow_id,
-                distance,
-                top_10_frame,
-                x,
-                y,
-                w,
-                h,
-            ) = map(float, values[:13])
-            frame = int(frame)
-            # annotations
-            if frame not in annotations:
-                annotations[frame] = []
-            annotations[frame].append(
-                (
-                    int(cow_tag),
-                    int(query_x),
-                    int(query_y),
-                    int(query_w),
-                    int(query_h),
-                    int(cow_id),
-                    float(distance),
-                    int(top_10_frame),
-                    int(x),
-                    int(y),
-                    int(w),
-                    int(h),
-                )
+        def build():
+            return IdentificationStore.build(
+                self.parse_identification_file(file_path)
+            ).to_arrays()
+
+        if self.parse_cache is None:
+            return IdentificationStore(build())
+        return IdentificationStore(
+            self.parse_cache.load(file_path, "identification", build)
+        )
+
+    def load_lazy_identification_annotations(
+        self,
+        file_path,
+        max_cached_frames=LazyIdentificationStore.DEFAULT_MAX_CACHED_FRAMES,
+    ):
+        """
+        Index the identification results file without parsing its rows.
+
+        Parameters:
+        - file_path: str, path to the identification results file
+        - max_cached_frames: int, number of parsed frames kept in memory
+
+        Returns:
+        - data : LazyIdentificationStore, identification rows per frame,
+          parsed on first access
+        """
+
+        def build():
+            return LazyIdentificationStore.scan(file_path)
+
+        if self.parse_cache is None:
+            arrays = build()
+        else:
+            arrays = self.parse_cache.load(file_path, "identification-offsets", build)
+        return LazyIdentificationStore(file_path, arrays, max_cached_frames)
+
+
+def random_annotation_records(rng, max_cows=4, max_frames=12, max_boxes=4, spread=4):
+    """
+    Make random annotation rows for checking the nearest-bbox linking.
+
+    Coordinates are drawn from a small range so that distances tie often,
+    and each cow skips some frames.
+
+    Parameters:
+    - rng: np.random.Generator
+    - max_cows: int, largest number of cows
+    - max_frames: int, largest number of frames
+    - max_boxes: int, largest number of boxes of a cow in a frame (1 gives
+      a single box per cow and frame)
+    - spread: int, coordinates are drawn from 0 to spread
+
+    Returns:
+    - records: np.ndarray, ANNOTATION_DTYPE rows in random order
+    """
+    rows = []
+    for cow_tag in range(int(rng.integers(0, max_cows + 1))):
+        frames = np.flatnonzero(rng.random(int(rng.integers(1, max_frames + 1))) < 0.7)
+        for frame in frames:
+            for camera in range(int(rng.integers(1, max_boxes + 1))):
+                x, y, w, h = rng.integers(0, spread + 1, 4)
+                rows.append((frame, cow_tag, x, y, w, h, camera))
+    records = np.array(rows, dtype=ANNOTATION_DTYPE)
+    return records[rng.permutation(len(records))]
+
+
+if __name__ == "__main__":
+    # Check the vectorized nearest-bbox linking against the greedy reference
+    parser = argparse.ArgumentParser(
+        description="Compare link_nearest_bboxes with the greedy reference, on "
+        "an annotations file or on random cases."
+    )
+    parser.add_argument(
+        "annotation_file",
+        nargs="?",
+        help="Path to the annotations file (default: random cases)",
+    )
+    parser.add_argument(
+        "--cases", type=int, default=1000, help="Number of random cases"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random cases")
+    args = parser.parse_args()
+
+    loader = AnnotationsLoader()
+    if args.annotation_file is None:
+        rng = np.random.default_rng(args.seed)
+        for case in range(args.cases):
+            # Every fourth case has a single box per cow and frame
+            records = random_annotation_records(
+                rng, max_boxes=1 if case % 4 == 0 else 4
             )
-        return annotations
+            greedy = loader.link_nearest_bboxes_greedy(records)
+            vectorized = loader.link_nearest_bboxes(records)
+            if not np.array_equal(greedy, vectorized):
+                print(f"Mismatch between greedy and vectorized linking in case {case}:")
+                print(records)
+                raise SystemExit(1)
+        print(f"Greedy and vectorized linking match on {args.cases} random cases")
+        raise SystemExit(0)
+
+    records = loader.parse_annotation_file(args.annotation_file)
+
+    start_time = time.perf_counter()
+    greedy = loader.link_nearest_bboxes_greedy(records)
+    greedy_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    vectorized = loader.link_nearest_bboxes(records)
+    vectorized_time = time.perf_counter() - start_time
+
+    print(f"Boxes: {len(records)}, selected: {len(vectorized)}")
+    print(f"Greedy: {greedy_time * 1000:.1f} ms")
+    print(f"Vectorized: {vectorized_time * 1000:.1f} ms")
+    if not np.array_equal(greedy, vectorized):
+        print("Mismatch between greedy and vectorized linking")
+        raise SystemExit(1)
+    print("Greedy and vectorized linking match")
@@ -0,0 +1,165 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from identification_store import QUERY_FIELDS
+
+# Ranked database candidates of the selected query cow, browsed page by page:
+# - The candidates of a query are cut to the top K (all of them if K is
+#   None) and kept as one compact array in rank order: cow ID, distance
+#   rounded for display, and the database box to crop.
+# - The arrays of recent queries are kept, so that redraws (clicks, overlay
+#   toggles, page flips, stepping back to a frame) reuse them instead of
+#   searching the identification rows again.
+# - Only the rows of the page on screen are turned into Python values.
+
+CANDIDATE_DTYPE = np.dtype(
+    [
+        ("cow_id", np.int32),
+        ("distance", np.float64),
+        ("frame", np.int32),
+        ("x", np.int32),
+        ("y", np.int32),
+        ("w", np.int32),
+        ("h", np.int32),
+    ]
+)
+
+# Crop row of a rank without a candidate: frame 0 has no database image
+EMPTY_CROP_ROW = (0, 0, 0, 0, 0)
+
+
+class CandidateList:
+    # Number of candidates of a query that can be browsed (None for all)
+    DEFAULT_TOP_K = 30
+    # Number of candidates on a page of the grid
+    DEFAULT_PAGE_SIZE = 10
+    # Number of queries whose candidates are kept
+    DEFAULT_MAX_CACHED_QUERIES = 64
+
+    def __init__(
+        self,
+        identification_store,
+        top_k=DEFAULT_TOP_K,
+        page_size=DEFAULT_PAGE_SIZE,
+        max_cached_queries=DEFAULT_MAX_CACHED_QUERIES,
+    ):
+        self.identification_store = identification_store
+        self.top_k = top_k
+        self.page_size = page_size
+        self.max_cached_queries = max_cached_queries
+        # Queries are also looked up by the tile prefetch thread
+        self.lock = threading.Lock()
+        self.queries = OrderedDict()  # query key -> candidates, LRU order
+        self.candidates = np.zeros(0, dtype=CANDIDATE_DTYPE)
+
+    def query(self, frame, cow_tag, query_bbox, excluded_ids=()):
+        """
+        Get the top-K candidates of a query cow, building them on first use.
+
+        Parameters:
+        - frame: int, the frame number of the query
+        - cow_tag: int, the tag of the query cow
+        - query_bbox: tuple, (x, y, w, h) of the query cow
+        - excluded_ids: list, database cow IDs to leave out (e.g. confirmed IDs)
+
+        Returns:
+        - candidates: np.ndarray, CANDIDATE_DTYPE rows in rank order (shared,
+          do not modify)
+        """
+        key = (
+            (int(frame), int(cow_tag))
+            + tuple(int(value) for value in query_bbox)
+            + (frozenset(int(cow_id) for cow_id in excluded_ids),)
+        )
+        with self.lock:
+            candidates = self.queries.get(key)
+            if candidates is not None:
+                self.queries.move_to_end(key)
+                return candidates
+
+        rows = self.identification_store.candidates(
+            frame, cow_tag, query_bbox, excluded_ids
+        )[: self.top_k]
+        candidates = np.empty(len(rows), dtype=CANDIDATE_DTYPE)
+        candidates["cow_id"] = rows["cow_id"]
+        candidates["distance"] = np.round(rows["distance"], 2)
+        candidates["frame"] = rows["top_10_frame"]
+        for name in ("x", "y", "w", "h"):
+            candidates[name] = rows[name]
+
+        with self.lock:
+            self.queries[key] = candidates
+            while len(self.queries) > self.max_cached_queries:
+                self.queries.popitem(last=False)
+        return candidates
+
+    def frame_query(self, frame, cow_tag, excluded_ids=()):
+        """
+        Get the top-K candidates of a cow in a frame whose query box is unknown.
+
+        Parameters:
+        - frame: int, the frame number
+        - cow_tag: int, the tag of the query cow
+        - excluded_ids: list, database cow IDs to leave out
+
+        Returns:
+        - candidates: np.ndarray, CANDIDATE_DTYPE rows of the first query of
+          the cow in that frame (empty if it has none)
+        """
+        rows = self.identification_store.frame_rows(frame)
+        rows = rows[rows["cow_tag"] == cow_tag]
+        if len(rows) == 0:
+            return np.zeros(0, dtype=CANDIDATE_DTYPE)
+        query_bbox = [rows[0][name] for name in QUERY_FIELDS[2:]]
+        return self.query(frame, cow_tag, query_bbox, excluded_ids)
+
+    def select(self, frame, cow_tag, query_bbox, excluded_ids=()):
+        # Make a query the one browsed
+        self.candidates = self.query(frame, cow_tag, query_bbox, excluded_ids)
+
+    def clear(self):
+        # Browse no query
+        self.candidates = np.zeros(0, dtype=CANDIDATE_DTYPE)
+
+    @property
+    def page_count(self):
+        # Pages of the pager: enough for K candidates, whatever the query
+        count = len(self.candidates) if self.top_k is None else self.top_k
+        return max(1, -(-count // self.page_size))
+
+    def rank(self, rank):
+        """
+        Get the candidate of a rank of the browsed query.
+
+        Parameters:
+        - rank: int, the rank, starting from 1
+
+        Returns:
+        - candidate: tuple, (cow_id, distance, frame_number, x, y, w, h), all
+          zero if the query has no candidate of that rank
+        """
+        if not 1 <= rank <= len(self.candidates):
+            return (0, 0.0) + EMPTY_CROP_ROW
+        return self.candidates[rank - 1].item()
+
+    def page_rows(self, page, candidates=None):
+        """
+        Get the crop rows of the candidates of a page.
+
+        Parameters:
+        - page: int, the page, starting from 1
+        - candidates: np.ndarray, CANDIDATE_DTYPE rows (default: the browsed
+          query)
+
+        Returns:
+        - rows: list, (frame_number, x, y, w, h) of the page_size ranks of the
+          page, EMPTY_CROP_ROW for the ranks without a candidate
+        """
+        if candidates is None:
+            candidates = self.candidates
+        start = (page - 1) * self.page_size
+        page_candidates = candidates[start : start + self.page_size]
+        rows = [row[2:] for row in page_candidates.tolist()]
+        return rows + [EMPTY_CROP_ROW] * (self.page_size - len(rows))
@@ -0,0 +1,167 @@
+import os
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from annotation_store import parse_annotation_rows
+from identification_store import parse_identification_rows
+
+# Parse very large annotation / identification text files on several cores:
+# - The file is split into byte ranges that end on line boundaries.
+# - Each range is parsed into a structured array in a worker process.
+# - The arrays are concatenated in file order, so the result matches a
+#   single-process parse row for row.
+
+ROW_PARSERS = {
+    "annotations": parse_annotation_rows,
+    "identification": parse_identification_rows,
+}
+
+
+def parse_file_range(file_path, start, stop, kind):
+    """
+    Parse the lines in a byte range of a file (runs in a worker process).
+
+    Parameters:
+    - file_path: str, path to the text file
+    - start: int, first byte of the range (start of a line)
+    - stop: int, end of the range (just after a newline, or end of file)
+    - kind: str, key of ROW_PARSERS
+
+    Returns:
+    - rows: np.ndarray, parsed rows of the range
+    """
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        lines = file.read(stop - start).decode().splitlines()
+    return ROW_PARSERS[kind](lines)
+
+
+def report_parse_throughput(backend, file_path, rows, elapsed):
+    """
+    Print how fast a file was parsed, to compare parser backends.
+
+    Parameters:
+    - backend: str, name of the parser backend
+    - file_path: str, path to the parsed file
+    - rows: int, number of rows parsed
+    - elapsed: float, seconds spent parsing
+
+    Returns:
+    - rows_per_second: float
+    """
+    rows_per_second = rows / elapsed if elapsed > 0 else float("inf")
+    print(
+        f"Parsed {rows} rows from {file_path} in {elapsed:.2f} s "
+        f"({rows_per_second:,.0f} rows/s, {backend})"
+    )
+    return rows_per_second
+
+
+class ChunkedParser:
+    # Size of the byte range given to each task
+    DEFAULT_CHUNK_SIZE = 1 << 25
+
+    def __init__(self, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def split(self, file_path):
+        """
+        Split a file into byte ranges that end on line boundaries.
+
+        Parameters:
+        - file_path: str, path to the text file
+
+        Returns:
+        - ranges: list, (start, stop) byte ranges covering the whole file
+        """
+        file_size = os.path.getsize(file_path)
+        ranges = []
+        start = 0
+        with open(file_path, "rb") as file:
+            while start < file_size:
+                stop = min(start + self.chunk_size, file_size)
+                if stop < file_size:
+                    # Extend the range to the end of the line it cuts
+                    file.seek(stop)
+                    stop += len(file.readline())
+                ranges.append((start, stop))
+                start = stop
+        return ranges
+
+    def parse(self, file_path, kind):
+        """
+        Parse a file in parallel.
+
+        Parameters:
+        - file_path: str, path to the text file
+        - kind: str, key of ROW_PARSERS ("annotations" or "identification")
+
+        Returns:
+        - rows: np.ndarray, parsed rows in file order
+        """
+        ranges = self.split(file_path)
+        if self.workers <= 1 or len(ranges) <= 1:
+            return ROW_PARSERS[kind](file_path)
+        # spawn keeps the workers clear of the parent's Tk state
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(ranges)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            parts = list(
+                executor.map(
+                    parse_file_range,
+                    [file_path] * len(ranges),
+                    [start for start, _ in ranges],
+                    [stop for _, stop in ranges],
+                    [kind] * len(ranges),
+                )
+            )
+        return np.concatenate(parts)
+
+
+if __name__ == "__main__":
+    # Compare the single-process and chunked parser backends on one file
+    parser = argparse.ArgumentParser(
+        description="Compare parser backends on an annotation or identification file."
+    )
+    parser.add_argument("file_path", help="Path to the text file")
+    parser.add_argument(
+        "--kind",
+        choices=sorted(ROW_PARSERS),
+        default="annotations",
+        help="What the file contains",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=ChunkedParser.DEFAULT_CHUNK_SIZE,
+        help="Bytes per task",
+    )
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    single = ROW_PARSERS[args.kind](args.file_path)
+    report_parse_throughput(
+        "single process", args.file_path, len(single), time.perf_counter() - start_time
+    )
+    chunked_parser = ChunkedParser(args.workers, args.chunk_size)
+    start_time = time.perf_counter()
+    chunked = chunked_parser.parse(args.file_path, args.kind)
+    report_parse_throughput(
+        f"chunked, {chunked_parser.workers} workers",
+        args.file_path,
+        len(chunked),
+        time.perf_counter() - start_time,
+    )
+    if not np.array_equal(single, chunked):
+        print("Mismatch between single-process and chunked parsing")
+        raise SystemExit(1)
+    print("Single-process and chunked parsing match")
@@ -0,0 +1,300 @@
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from annotation_store import find_key
+from decode_service import crop_frame
+from frame_cache import FrameCache
+from frame_pack import PackedImageFile, directory_stamp
+from parse_cache import DEFAULT_CACHE_DIR
+
+# Per-cow crops of an image directory, extracted offline:
+# - For every cow of the nearest bounding box tracks, the box of each frame
+#   is cut out with a margin and saved as a JPEG; the crops of one cow are
+#   concatenated into 'cow_<tag>.atlas'.
+# - 'cow_<tag>.atlas.npy' is its offset table: frame, offset and length of
+#   each crop, and the position of the crop in the frame.
+# - 'meta.json' records the annotation file and image directory the atlas
+#   was built from; an atlas built from other ones is not used.
+# - The selected cow and multi-view panes then crop from the atlas and never
+#   decode a full frame.
+
+ATLAS_INDEX_DTYPE = np.dtype(
+    [
+        ("frame", np.int32),
+        ("offset", np.int64),
+        ("length", np.int64),
+        ("x", np.int32),
+        ("y", np.int32),
+    ]
+)
+
+
+def atlas_dir(image_dir, cache_dir=DEFAULT_CACHE_DIR):
+    path_hash = hashlib.sha1(os.path.abspath(image_dir).encode()).hexdigest()
+    return os.path.join(cache_dir, "atlas", path_hash[:16])
+
+
+def atlas_paths(directory, cow_tag):
+    """
+    Get the paths of the atlas of a cow.
+
+    Parameters:
+    - directory: str, the atlas directory
+    - cow_tag: int, the cow tag
+
+    Returns:
+    - data_path: str, path to the concatenated JPEG crops
+    - index_path: str, path to the offset table
+    """
+    data_path = os.path.join(directory, f"cow_{cow_tag}.atlas")
+    return data_path, data_path + ".npy"
+
+
+def source_stamp(annotation_file, image_dir):
+    # What the atlas was built from: it is stale as soon as one of them changes
+    annotation_stat = os.stat(annotation_file)
+    return {
+        "annotation_file": os.path.abspath(annotation_file),
+        "annotation_size": annotation_stat.st_size,
+        "annotation_mtime_ns": annotation_stat.st_mtime_ns,
+        "image_dir": os.path.abspath(image_dir),
+        "image_dir_stamp": directory_stamp(image_dir),
+    }
+
+
+class CropAtlas:
+    # Bump when the atlas layout changes
+    FORMAT_VERSION = 1
+    # Margin around the boxes: the largest one used by the panes
+    DEFAULT_MARGIN = 25
+    DEFAULT_QUALITY = 95
+
+    def __init__(self, directory, margin):
+        self.directory = directory
+        self.margin = margin
+        self.cows = {}  # cow_tag -> (index, mapping view), or None if no crops
+
+    @classmethod
+    def load(cls, image_dir, annotation_file, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        Open the crop atlas of an image directory, if it has been built.
+
+        Parameters:
+        - image_dir: str, the image directory
+        - annotation_file: str, the annotation file of the video
+        - cache_dir: str, the cache directory
+
+        Returns:
+        - crop_atlas: CropAtlas, or None if missing or out of date
+        """
+        directory = atlas_dir(image_dir, cache_dir)
+        try:
+            with open(os.path.join(directory, "meta.json"), "r") as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        source = source_stamp(annotation_file, image_dir)
+        if meta.get("version") != cls.FORMAT_VERSION or meta.get("source") != source:
+            print(f"Ignoring out-of-date crop atlas {directory}")
+            return None
+        print(f"Loaded crop atlas {directory}")
+        return cls(directory, meta["margin"])
+
+    def cow(self, cow_tag):
+        # Offset table and mapping of a cow's atlas, opened on first use
+        if cow_tag not in self.cows:
+            data_path, index_path = atlas_paths(self.directory, cow_tag)
+            try:
+                index = np.load(index_path)
+                with open(data_path, "rb") as file:
+                    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.cows[cow_tag] = (index, memoryview(data))
+            except (OSError, ValueError):
+                self.cows[cow_tag] = None
+        return self.cows[cow_tag]
+
+    def crop(self, cow_tag, frame, box):
+        """
+        Crop a box around a cow out of its atlas.
+
+        The box must be the cow's bounding box in that frame with a margin of
+        at most self.margin; the result is the same as cropping the frame.
+
+        Parameters:
+        - cow_tag: int, the cow tag
+        - frame: int, the frame number
+        - box: tuple, (x1, y1, x2, y2) in frame pixels
+
+        Returns:
+        - cropped_img: PIL Image object, or None if the atlas has no such crop
+        """
+        cow = self.cow(cow_tag)
+        if cow is None:
+            return None
+        index, view = cow
+        position = find_key(index["frame"], frame)
+        if position < 0:
+            return None
+        entry = index[position]
+        start = int(entry["offset"])
+        with Image.open(
+            PackedImageFile(view[start : start + int(entry["length"])])
+        ) as file:
+            img = file.convert("RGB")
+        x, y = int(entry["x"]), int(entry["y"])
+        x1, y1, x2, y2 = box
+        # The atlas crop covers the box clipped to the frame, so clipping to
+        # the atlas crop clips to the frame
+        return crop_frame(img, (x1 - x, y1 - y, x2 - x, y2 - y))
+
+
+def build_crop_atlas(
+    nearest_bbox_per_cow,
+    frame_index,
+    directory,
+    margin=CropAtlas.DEFAULT_MARGIN,
+    quality=CropAtlas.DEFAULT_QUALITY,
+    workers=None,
+    max_open_cows=256,
+):
+    """
+    Extract the crops of every cow into per-cow atlas files.
+
+    Each frame is decoded once per batch of max_open_cows cows, and the
+    crops of all the cows of the batch are cut out of it.
+
+    Parameters:
+    - nearest_bbox_per_cow: NearestBboxView, cow tag to frame to (distance, box)
+    - frame_index: FrameIndex or FramePack, the frames of the video
+    - directory: str, the atlas directory
+    - margin: int, margin around the boxes (pixels)
+    - quality: int, JPEG quality of the crops
+    - workers: int, number of decoding threads (default: CPU count)
+    - max_open_cows: int, number of cow atlas files written at once
+
+    Returns:
+    - crop_count: int, number of crops written
+    """
+    os.makedirs(directory, exist_ok=True)
+    # Decodes are never kept: the cache is only used for its decoding
+    frame_cache = FrameCache(max_bytes=0)
+    cow_tags = list(nearest_bbox_per_cow)
+    crop_count = 0
+
+    for batch_start in range(0, len(cow_tags), max_open_cows):
+        batch = cow_tags[batch_start : batch_start + max_open_cows]
+        boxes_per_frame = {}  # frame -> list of (cow_tag, box)
+        for cow_tag in batch:
+            for frame, (_, (x, y, w, h)) in nearest_bbox_per_cow[cow_tag].items():
+                if frame in frame_index:
+                    box = (x - margin, y - margin, x + w + margin, y + h + margin)
+                    boxes_per_frame.setdefault(frame, []).append((cow_tag, box))
+
+        def extract(frame):
+            img = frame_cache.decode(frame_index[frame])
+            crops = []
+            for cow_tag, box in boxes_per_frame[frame]:
+                buffer = io.BytesIO()
+                crop_frame(img, box).save(buffer, "JPEG", quality=quality)
+                x, y = max(0, box[0]), max(0, box[1])
+                crops.append((cow_tag, buffer.getvalue(), x, y))
+            return frame, crops
+
+        files = {}
+        rows = {cow_tag: [] for cow_tag in batch}
+        try:
+            for cow_tag in batch:
+                data_path, _ = atlas_paths(directory, cow_tag)
+                files[cow_tag] = open(data_path + ".tmp", "wb")
+            with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+                # Frames in order, so that each offset table is sorted by frame
+                for frame, crops in executor.map(extract, sorted(boxes_per_frame)):
+                    for cow_tag, data, x, y in crops:
+                        file = files[cow_tag]
+                        rows[cow_tag].append((frame, file.tell(), len(data), x, y))
+                        file.write(data)
+        finally:
+            for file in files.values():
+                file.close()
+
+        for cow_tag in batch:
+            data_path, index_path = atlas_paths(directory, cow_tag)
+            with open(index_path + ".tmp", "wb") as index_file:
+                np.save(index_file, np.array(rows[cow_tag], dtype=ATLAS_INDEX_DTYPE))
+            os.replace(data_path + ".tmp", data_path)
+            os.replace(index_path + ".tmp", index_path)
+            crop_count += len(rows[cow_tag])
+    return crop_count
+
+
+if __name__ == "__main__":
+    from annotations_loader import AnnotationsLoader
+    from frame_catalog import FrameCatalog
+    from parse_cache import ParseCache
+
+    # Build the crop atlas of a video
+    parser = argparse.ArgumentParser(
+        description="Extract the crops of every cow of a video into an atlas."
+    )
+    parser.add_argument(
+        "annotation_file", help="Annotation file (e.g. Config.ANNOTATION_FILE)"
+    )
+    parser.add_argument("image_dir", help="Image directory (e.g. Config.IMAGE_DIR)")
+    parser.add_argument(
+        "--margin",
+        type=int,
+        default=CropAtlas.DEFAULT_MARGIN,
+        help="Margin around the boxes, at least the largest one of the panes",
+    )
+    parser.add_argument(
+        "--quality",
+        type=int,
+        default=CropAtlas.DEFAULT_QUALITY,
+        help="JPEG quality of the crops",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of decoding threads"
+    )
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    annotation_store = AnnotationsLoader(ParseCache()).load_annotation_store(
+        args.annotation_file
+    )
+    frame_index = FrameCatalog().frames(args.image_dir)
+    directory = atlas_dir(args.image_dir)
+    # A previous atlas is not used while it is being replaced
+    meta_path = os.path.join(directory, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    crop_count = build_crop_atlas(
+        annotation_store.nearest_bbox_per_cow,
+        frame_index,
+        directory,
+        args.margin,
+        args.quality,
+        args.workers,
+    )
+
+    # Written last: the atlas is only used once it is complete
+    meta = {
+        "version": CropAtlas.FORMAT_VERSION,
+        "margin": args.margin,
+        "source": source_stamp(args.annotation_file, args.image_dir),
+    }
+    with open(f"{meta_path}.{os.getpid()}", "w") as file:
+        json.dump(meta, file)
+    os.replace(f"{meta_path}.{os.getpid()}", meta_path)
+    print(
+        f"Built {crop_count} crops of {len(annotation_store.nearest_bbox_per_cow)} "
+        f"cows into {directory} in {time.perf_counter() - start_time:.1f} s"
+    )
@@ -0,0 +1,270 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from PIL import Image
+
+# Process-pool image decoding for the crop panes:
+# - Frames are decoded, cropped and resized in worker processes, so several
+#   JPEGs decode at once without contending for the GIL.
+# - The parent allocates a shared memory block for each result; the worker
+#   writes the pixels into it and only the image size goes through pickles.
+# - Sources are paths, or (data file, offset, length) for packed frames.
+
+
+def source_spec(source):
+    """
+    Get a picklable description of an image source.
+
+    Parameters:
+    - source: str or PackedFrame, the image source
+
+    Returns:
+    - spec: tuple, ("file", path) or ("pack", data_path, offset, length)
+    """
+    if isinstance(source, str):
+        return ("file", source)
+    offset, length = source.pack.location(source.frame)
+    return ("pack", source.pack.data_path, offset, length)
+
+
+def open_spec(spec):
+    if spec[0] == "file":
+        return Image.open(spec[1])
+    _, data_path, offset, length = spec
+    with open(data_path, "rb") as file:
+        file.seek(offset)
+        return Image.open(io.BytesIO(file.read(length)))
+
+
+def crop_frame(img, box):
+    """
+    Crop a box out of a frame, clipped to the frame.
+
+    Parameters:
+    - img: PIL Image object, the frame
+    - box: tuple, (x1, y1, x2, y2) in frame pixels
+
+    Returns:
+    - cropped_img: PIL Image object
+    """
+    x1, y1, x2, y2 = box
+    return img.crop(
+        (max(0, x1), max(0, y1), min(img.width, x2), min(img.height, y2))
+    )
+
+
+def decode_into(shm_name, spec, box, size):
+    """
+    Decode an image in a worker and write its pixels to shared memory.
+
+    Parameters:
+    - shm_name: str, name of the shared memory block allocated by the parent
+    - spec: tuple, see source_spec
+    - box: tuple, (x1, y1, x2, y2) to crop, or None
+    - size: tuple, (width, height) to resize to, or None
+
+    Returns:
+    - size: tuple, (width, height) of the image written
+    """
+    with open_spec(spec) as file:
+        if size is not None and box is None:
+            file.draft("RGB", size)
+        img = file.convert("RGB")
+    if box is not None:
+        img = crop_frame(img, box)
+    if size is not None and img.size != size:
+        img = img.resize(size, Image.LANCZOS)
+
+    shm = SharedMemory(name=shm_name)
+    try:
+        pixels = np.ndarray((img.height, img.width, 3), np.uint8, buffer=shm.buf)
+        pixels[...] = np.asarray(img)
+        del pixels
+    finally:
+        shm.close()
+    return img.size
+
+
+class DecodeRequest:
+    # Pending result of a DecodeService request
+
+    def __init__(self, future, shm, service):
+        self.future = future
+        self.shm = shm
+        self.service = service
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        """
+        Wait for the image and copy it out of shared memory.
+
+        Parameters:
+        None
+
+        Returns:
+        - img: PIL Image object, RGB
+        """
+        try:
+            width, height = self.future.result()
+            pixels = np.ndarray((height, width, 3), np.uint8, buffer=self.shm.buf)
+            img = Image.fromarray(pixels.copy())
+            del pixels
+            return img
+        finally:
+            self.release()
+
+    def release(self):
+        # Free the shared memory block, once, whichever thread gets here first
+        if not self.service.forget(self):
+            return
+        try:
+            self.shm.close()
+        except BufferError:
+            # Still being copied out by result() on another thread; the
+            # mapping goes with it, the name is freed now
+            pass
+        self.shm.unlink()
+
+
+class DecodeService:
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        # spawn keeps the workers clear of the parent's Tk state
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        # Requests whose shared memory is not released yet, freed on close
+        self.lock = threading.Lock()
+        self.outstanding = set()
+
+    def submit(self, source, box=None, size=None):
+        """
+        Decode an image in the pool.
+
+        Parameters:
+        - source: str or PackedFrame, the image source
+        - box: tuple, (x1, y1, x2, y2) to crop (clipped to the frame), or None
+        - size: tuple, (width, height) to resize to, or None
+
+        Returns:
+        - request: DecodeRequest, whose result() is the PIL image
+        """
+        if size is not None:
+            width, height = size
+        elif box is not None:
+            # Upper bound: clipping to the frame only makes the crop smaller
+            width, height = box[2] - box[0], box[3] - box[1]
+        else:
+            raise ValueError("A crop box or a size is needed to allocate the result")
+        shm = SharedMemory(create=True, size=max(1, width * height * 3))
+        try:
+            future = self.executor.submit(
+                decode_into, shm.name, source_spec(source), box, size
+            )
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        request = DecodeRequest(future, shm, self)
+        with self.lock:
+            self.outstanding.add(request)
+        return request
+
+    def crop(self, source, box):
+        return self.submit(source, box=box)
+
+    def resize(self, source, size):
+        return self.submit(source, size=size)
+
+    def forget(self, request):
+        # True if the request was still outstanding
+        with self.lock:
+            if request not in self.outstanding:
+                return False
+            self.outstanding.remove(request)
+            return True
+
+    def close(self):
+        # Requests cancelled here, or never waited for, are freed too
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            requests = list(self.outstanding)
+        for request in requests:
+            request.release()
+
+
+def crop_frames(jobs, frame_cache, decode_service=None):
+    """
+    Crop boxes out of several frames, decoding them in parallel if possible.
+
+    Frames already in the frame cache are cropped in place; the others are
+    decoded by the decode service, all at once, or one by one through the
+    frame cache if there is no service.
+
+    Parameters:
+    - jobs: list, (source, box) pairs; a None source gives a None crop
+    - frame_cache: FrameCache, the decoded frames shared by the panes
+    - decode_service: DecodeService, or None to decode in this process
+
+    Returns:
+    - crops: list, PIL Image objects in the order of the jobs
+    """
+    pending = []
+    for source, box in jobs:
+        if source is None:
+            pending.append(None)
+            continue
+        img = frame_cache.lookup((source, None))
+        if img is not None:
+            pending.append(crop_frame(img, box))
+        elif decode_service is not None:
+            pending.append(decode_service.crop(source, box))
+        else:
+            pending.append(crop_frame(frame_cache.get(source), box))
+    # Every request is waited for, so that all of their shared memory is
+    # freed even if one of them failed
+    crops = []
+    error = None
+    for request in pending:
+        if isinstance(request, DecodeRequest):
+            try:
+                request = request.result()
+            except Exception as request_error:
+                error = error or request_error
+                request = None
+        crops.append(request)
+    if error is not None:
+        raise error
+    return crops
+
+
+def preview_crops(jobs, frame_cache):
+    """
+    Quick, low-quality versions of the crops of crop_frames.
+
+    Parameters:
+    - jobs: list, (source, box) pairs; a None source gives a None crop
+    - frame_cache: FrameCache, the decoded frames shared by the panes
+
+    Returns:
+    - crops: list, PIL Image objects of the same sizes as crop_frames' crops
+    """
+    crops = []
+    for source, box in jobs:
+        if source is None:
+            crops.append(None)
+            continue
+        img = frame_cache.lookup((source, None))
+        if img is not None:
+            # Cropping a decoded frame is as fast as any preview
+            crops.append(crop_frame(img, box))
+        else:
+            crops.append(frame_cache.preview(source, box=box))
+    return crops
@@ -0,0 +1,175 @@
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+# Memory-bounded LRU cache of decoded frames, shared by all panes:
+# - Entries are keyed on (image source, target size); a size of None is the
+#   full-resolution frame, used for cropping. The source is a path, or a
+#   PackedFrame for frames read from a pack.
+# - A resized entry is derived from the cached full-resolution frame when
+#   there is one, so each JPEG is decoded at most once while it stays cached.
+# - Otherwise it is decoded at reduced resolution (JPEG draft mode, 1/2 to
+#   1/8 scale in the DCT domain) as close to the target size as allowed, and
+#   resized to it with LANCZOS, up if the decode is slightly smaller.
+# - Cached images are shared: callers must copy them before drawing on them.
+
+
+class FrameCache:
+    # Default memory budget of the decoded pixels (bytes)
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+    # Smallest reduced decode allowed, as a fraction of the target size
+    # (1.0 never decodes below the target size, so never upscales; 0.75 lets
+    # the 1200 px main view use the 1/2 scale decode of 1920 px frames)
+    DEFAULT_DRAFT_TOLERANCE = 0.75
+    # Resolution of previews, as a fraction of their size (see preview)
+    PREVIEW_SCALE = 0.25
+
+    def __init__(
+        self, max_bytes=DEFAULT_MAX_BYTES, draft_tolerance=DEFAULT_DRAFT_TOLERANCE
+    ):
+        self.max_bytes = max_bytes
+        self.draft_tolerance = draft_tolerance
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (path, size) -> image, LRU order
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def image_bytes(img):
+        return img.width * img.height * len(img.getbands())
+
+    def lookup(self, key):
+        with self.lock:
+            img = self.entries.get(key)
+            if img is not None:
+                self.entries.move_to_end(key)
+            return img
+
+    def put(self, key, img):
+        """
+        Add an image to the cache, evicting the least recently used ones.
+
+        Parameters:
+        - key: tuple, (image path, target size or None)
+        - img: PIL Image object
+
+        Returns:
+        None
+        """
+        size = self.image_bytes(img)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = img
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= self.image_bytes(evicted)
+
+    def decode(self, path, size=None):
+        """
+        Decode an image, at reduced resolution when it is resized anyway.
+
+        Parameters:
+        - path: str or PackedFrame, the image source
+        - size: tuple, (width, height) to resize to, or None for full resolution
+
+        Returns:
+        - img: PIL Image object, RGB
+        """
+        source = path if isinstance(path, str) else path.open()
+        with Image.open(source) as file:
+            if size is not None:
+                # libjpeg picks the largest 1/2^n scale that stays above this size
+                file.draft(
+                    "RGB",
+                    (
+                        int(size[0] * self.draft_tolerance),
+                        int(size[1] * self.draft_tolerance),
+                    ),
+                )
+            img = file.convert("RGB")
+        if size is not None and img.size != size:
+            img = img.resize(size, Image.LANCZOS)
+        return img
+
+    def preview(self, path, size=None, box=None):
+        """
+        Decode a quick, low-quality version of an image or of a region of it.
+
+        The JPEG is decoded at about PREVIEW_SCALE of the requested size and
+        scaled up with BILINEAR. Previews are not cached.
+
+        Parameters:
+        - path: str or PackedFrame, the image source
+        - size: tuple, (width, height) of the preview, or None for the region size
+        - box: tuple, (x1, y1, x2, y2) region (clipped to the image), or None
+
+        Returns:
+        - img: PIL Image object, RGB
+        """
+        source = path if isinstance(path, str) else path.open()
+        with Image.open(source) as file:
+            full_width, full_height = file.size
+            x1, y1, x2, y2 = box or (0, 0, full_width, full_height)
+            x1, y1 = max(0, x1), max(0, y1)
+            x2 = max(x1 + 1, min(full_width, x2))
+            y2 = max(y1 + 1, min(full_height, y2))
+            if size is None:
+                size = (x2 - x1, y2 - y1)
+            ratio = self.PREVIEW_SCALE * size[0] / (x2 - x1)
+            file.draft("RGB", (int(full_width * ratio), int(full_height * ratio)))
+            img = file.convert("RGB")
+        scale = img.width / full_width
+        return img.resize(
+            size, Image.BILINEAR, box=(x1 * scale, y1 * scale, x2 * scale, y2 * scale)
+        )
+
+    def get(self, path, size=None):
+        """
+        Get a decoded frame, decoding and resizing it only on a cache miss.
+
+        Parameters:
+        - path: str, path to the image file
+        - size: tuple, (width, height) to resize to, or None for full resolution
+
+        Returns:
+        - img: PIL Image object, RGB (shared with the cache, do not modify)
+        """
+        key = (path, size)
+        img = self.lookup(key)
+        with self.lock:
+            if img is not None:
+                self.hits += 1
+                return img
+            self.misses += 1
+
+        full_img = None if size is None else self.lookup((path, None))
+        if full_img is None:
+            img = self.decode(path, size)
+        else:
+            img = full_img.resize(size, Image.LANCZOS)
+        self.put(key, img)
+        return img
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Parameters:
+        None
+
+        Returns:
+        - stats: dict, hits, misses, entries and bytes in use
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+            }
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import re
+
+from frame_pack import FramePack
+from parse_cache import DEFAULT_CACHE_DIR
+
+# Frame numbering of the image directories, shared by all panes:
+# - Each directory is scanned once with os.scandir; frame numbers are parsed
+#   from the file names (last group of digits), frame 1 being the first one.
+# - Frames without an image file map to None instead of shifting the rest.
+# - The scan is saved as a JSON manifest and reused until the modification
+#   time of the directory changes.
+# - A directory converted with frame_pack.py is read from its pack instead,
+#   as long as it has not changed since it was packed.
+
+FRAME_NUMBER_PATTERN = re.compile(r"(\d+)(?!.*\d)")
+
+
+class FrameIndex:
+    def __init__(self, directory, frame_files):
+        """
+        Parameters:
+        - directory: str, the image directory
+        - frame_files: dict, frame number to file name
+        """
+        self.directory = directory
+        self.frame_files = frame_files
+        self.last_frame = max(frame_files, default=0)
+
+    def __len__(self):
+        # Like the old file lists: a dummy index 0, then one index per frame
+        return self.last_frame + 1
+
+    def __getitem__(self, frame):
+        """
+        Get the path of a frame.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - path: str, path to the image, or None if the frame has no image
+        """
+        name = self.frame_files.get(int(frame))
+        if name is None:
+            return None
+        return os.path.join(self.directory, name)
+
+    def __contains__(self, frame):
+        return frame in self.frame_files
+
+
+class FrameCatalog:
+    # Bump when the manifest layout changes
+    MANIFEST_VERSION = 1
+    IMAGE_EXTENSION = ".jpg"
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = os.path.join(cache_dir, "catalog")
+        self.indexes = {}  # directory -> FrameIndex
+
+    def frames(self, directory):
+        """
+        Get the frame index of an image directory, scanning it only once.
+
+        Parameters:
+        - directory: str, the image directory
+
+        Returns:
+        - index: FrameIndex, or FramePack if the directory has been packed
+        """
+        if directory not in self.indexes:
+            frame_index = self.load(directory)
+            # The pack is only used while the directory is as it was packed
+            pack = FramePack.load(directory)
+            if pack is not None:
+                print(f"Reading {directory} from its pack")
+                self.indexes[directory] = pack
+            else:
+                self.indexes[directory] = frame_index
+        return self.indexes[directory]
+
+    def manifest_path(self, directory):
+        path_hash = hashlib.sha1(os.path.abspath(directory).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{path_hash[:16]}.json")
+
+    def load(self, directory):
+        """
+        Load the frame index of a directory from its manifest, or scan it.
+
+        Parameters:
+        - directory: str, the image directory
+
+        Returns:
+        - index: FrameIndex
+        """
+        mtime_ns = os.stat(directory).st_mtime_ns
+        manifest_path = self.manifest_path(directory)
+        try:
+            with open(manifest_path, "r") as file:
+                manifest = json.load(file)
+            if (
+                manifest["version"] == self.MANIFEST_VERSION
+                and manifest["mtime_ns"] == mtime_ns
+            ):
+                frame_files = {frame: name for frame, name in manifest["frames"]}
+                return FrameIndex(directory, frame_files)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        frame_files = self.scan(directory)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{manifest_path}.{os.getpid()}"
+            with open(temp_path, "w") as file:
+                json.dump(
+                    {
+                        "version": self.MANIFEST_VERSION,
+                        "directory": os.path.abspath(directory),
+                        "mtime_ns": mtime_ns,
+                        "frames": sorted(frame_files.items()),
+                    },
+                    file,
+                )
+            os.replace(temp_path, manifest_path)
+        except OSError as error:
+            # The manifest is only an accelerator; keep going without it
+            print(f"Could not write the frame manifest of {directory}: {error}")
+        return FrameIndex(directory, frame_files)
+
+    def scan(self, directory):
+        """
+        Scan an image directory and number its frames.
+
+        Frame numbers are parsed from the file names, the smallest one being
+        frame 1. If some names have no number or share one, the files are
+        numbered in name order instead, like the sorted file lists were.
+
+        Parameters:
+        - directory: str, the image directory
+
+        Returns:
+        - frame_files: dict, frame number to file name
+        """
+        with os.scandir(directory) as entries:
+            names = sorted(
+                entry.name
+                for entry in entries
+                if entry.name.endswith(self.IMAGE_EXTENSION) and entry.is_file()
+            )
+        print(f"Scanned {len(names)} images in {directory}")
+
+        numbers = []
+        for name in names:
+            match = FRAME_NUMBER_PATTERN.search(name[: -len(self.IMAGE_EXTENSION)])
+            if match is None:
+                break
+            numbers.append(int(match.group(1)))
+        if len(numbers) == len(names) and len(set(numbers)) == len(numbers):
+            first = min(numbers, default=1)
+            return {number - first + 1: name for number, name in zip(numbers, names)}
+        return {frame: name for frame, name in enumerate(names, start=1)}
@@ -0,0 +1,247 @@
+import argparse
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import time
+
+import numpy as np
+
+from annotation_store import find_key
+
+# Single-file storage of an image directory:
+# - '<directory>.pack' holds the JPEG files of the frames, concatenated.
+# - '<directory>.pack.npz' holds the offset table (frame, offset and length
+#   of each JPEG in the data file, sorted by frame) and a stamp of the name,
+#   size and modification time of every file of the directory when it was
+#   packed. A directory changed since then, even by a file overwritten in
+#   place, is read from its files again, not from the stale pack.
+# - The data file is memory-mapped once; frames are decoded straight from
+#   the mapping, so opening a frame costs no file system call.
+
+PACK_INDEX_DTYPE = np.dtype(
+    [("frame", np.int32), ("offset", np.int64), ("length", np.int64)]
+)
+
+
+def pack_paths(directory):
+    """
+    Get the paths of the pack of an image directory.
+
+    Parameters:
+    - directory: str, the image directory
+
+    Returns:
+    - data_path: str, path to the concatenated JPEG data
+    - index_path: str, path to the offset table
+    """
+    data_path = os.path.normpath(directory) + ".pack"
+    return data_path, data_path + ".npz"
+
+
+def directory_stamp(directory):
+    """
+    Stamp the files of a directory, to tell whether any of them changed.
+
+    Parameters:
+    - directory: str, the directory
+
+    Returns:
+    - stamp: str, hash of the (name, size, mtime_ns) of every file, which
+      changes with any file added, removed or rewritten
+    """
+    digest = hashlib.sha1()
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        if entry.is_file():
+            stat = entry.stat()
+            digest.update(
+                f"{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode()
+            )
+    return digest.hexdigest()
+
+
+class PackedImageFile(io.RawIOBase):
+    # Read-only file over a slice of the pack mapping, without copying it
+
+    def __init__(self, view):
+        self.view = view
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), len(self.view) - self.position)
+        buffer[:size] = self.view[self.position : self.position + size]
+        self.position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+class PackedFrame:
+    # Source of one packed frame, usable as a FrameCache key in place of a path
+
+    def __init__(self, pack, frame):
+        self.pack = pack
+        self.frame = frame
+
+    def open(self):
+        return self.pack.open(self.frame)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, PackedFrame)
+            and self.pack.data_path == other.pack.data_path
+            and self.frame == other.frame
+        )
+
+    def __hash__(self):
+        return hash((self.pack.data_path, self.frame))
+
+    def __repr__(self):
+        return f"{self.pack.data_path}:{self.frame}"
+
+
+class FramePack:
+    # Same interface as FrameIndex, with PackedFrame sources instead of paths
+
+    def __init__(self, directory, index):
+        self.data_path, self.index_path = pack_paths(directory)
+        self.index = index
+        with open(self.data_path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.data)
+        self.last_frame = int(self.index["frame"][-1]) if len(self.index) else 0
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Open the pack of an image directory, if it is up to date.
+
+        Parameters:
+        - directory: str, the image directory
+
+        Returns:
+        - pack: FramePack, or None if missing or out of date
+        """
+        data_path, index_path = pack_paths(directory)
+        if not os.path.exists(data_path):
+            return None
+        try:
+            with np.load(index_path) as arrays:
+                index, source = arrays["index"], arrays["source"]
+        except (OSError, ValueError, KeyError):
+            print(f"Ignoring the pack {data_path}: no valid index, pack it again")
+            return None
+        if str(source) != directory_stamp(directory):
+            print(
+                f"Ignoring out-of-date pack {data_path}: "
+                f"{directory} has changed since it was packed"
+            )
+            return None
+        return cls(directory, index)
+
+    def __len__(self):
+        # Like the old file lists: a dummy index 0, then one index per frame
+        return self.last_frame + 1
+
+    def __getitem__(self, frame):
+        """
+        Get the source of a frame.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - source: PackedFrame, or None if the frame has no image
+        """
+        if find_key(self.index["frame"], frame) < 0:
+            return None
+        return PackedFrame(self, int(frame))
+
+    def __contains__(self, frame):
+        return find_key(self.index["frame"], frame) >= 0
+
+    def open(self, frame):
+        """
+        Open the JPEG of a frame as a file, for Image.open.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - file: PackedImageFile, reading from the mapping
+        """
+        start, length = self.location(frame)
+        return PackedImageFile(self.view[start : start + length])
+
+    def location(self, frame):
+        # Offset and length of the JPEG of a frame in the data file
+        entry = self.index[find_key(self.index["frame"], frame)]
+        return int(entry["offset"]), int(entry["length"])
+
+
+def write_pack(frame_index, directory):
+    """
+    Pack the frames of an image directory into one data file.
+
+    Parameters:
+    - frame_index: FrameIndex, the frame numbering of the directory
+    - directory: str, the image directory
+
+    Returns:
+    - index: np.ndarray, PACK_INDEX_DTYPE offset table
+    """
+    data_path, index_path = pack_paths(directory)
+    frames = sorted(frame_index.frame_files)
+    # Taken before reading the files, so a change made meanwhile shows up
+    source = np.array(directory_stamp(directory))
+    index = np.zeros(len(frames), dtype=PACK_INDEX_DTYPE)
+    offset = 0
+    # Write next to the final files, then swap them in
+    with open(data_path + ".tmp", "wb") as data_file:
+        for i, frame in enumerate(frames):
+            with open(frame_index[frame], "rb") as image_file:
+                shutil.copyfileobj(image_file, data_file)
+                length = image_file.tell()
+            index[i] = (frame, offset, length)
+            offset += length
+    with open(index_path + ".tmp", "wb") as index_file:
+        np.savez(index_file, index=index, source=source)
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(index_path + ".tmp", index_path)
+    return index
+
+
+if __name__ == "__main__":
+    from frame_catalog import FrameCatalog
+
+    # Convert an image directory into a pack next to it
+    parser = argparse.ArgumentParser(
+        description="Pack the JPEG frames of an image directory into one file."
+    )
+    parser.add_argument("directory", help="Image directory (e.g. Config.IMAGE_DIR)")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    frame_index = FrameCatalog().load(args.directory)
+    index = write_pack(frame_index, args.directory)
+    data_path, index_path = pack_paths(args.directory)
+    print(
+        f"Packed {len(index)} frames ({index['length'].sum() / 1e6:.1f} MB) "
+        f"into {data_path} in {time.perf_counter() - start_time:.1f} s"
+    )
@@ -0,0 +1,176 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+# Background decoding of video frames for the main view:
+# - Frames around the current one are decoded and resized to the display
+#   width by a thread pool, mostly ahead of it in the current step direction.
+# - Decoded frames are plain display-size RGB images without overlays, kept
+#   in the shared FrameCache so frames left behind stay cheap to revisit.
+# - Hits and misses count how often a requested frame was already decoded.
+
+
+class FramePrefetcher:
+    # Number of steps decoded ahead of the current frame
+    DEFAULT_DEPTH = 8
+    # Number of steps kept behind the current frame, for stepping back
+    DEFAULT_BEHIND = 2
+    DEFAULT_WORKERS = 4
+
+    def __init__(
+        self,
+        image_files,
+        frame_cache,
+        display_size,
+        depth=DEFAULT_DEPTH,
+        behind=DEFAULT_BEHIND,
+        workers=DEFAULT_WORKERS,
+    ):
+        self.image_files = image_files
+        self.frame_cache = frame_cache
+        self.display_size = display_size
+        self.depth = depth
+        self.behind = behind
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="frame-prefetch"
+        )
+        self.lock = threading.Lock()
+        self.futures = {}  # frame -> Future of the display-size image
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, frame):
+        """
+        Decode a frame and resize it to the display size.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - img: PIL Image object, RGB image of size display_size
+        """
+        img_path = self.image_files[frame]
+        if img_path is None:
+            # No image for this frame: show a black frame
+            return Image.new("RGB", self.display_size)
+        return self.frame_cache.get(img_path, self.display_size)
+
+    def preview(self, frame):
+        """
+        Decode a quick, low-quality display-size image of a frame.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - img: PIL Image object, RGB image of size display_size
+        """
+        img_path = self.image_files[frame]
+        if img_path is None:
+            return Image.new("RGB", self.display_size)
+        return self.frame_cache.preview(img_path, self.display_size)
+
+    def cached(self, frame):
+        # Display-size image of a frame still in the frame cache, or None
+        img_path = self.image_files[frame]
+        if img_path is None:
+            return None
+        return self.frame_cache.lookup((img_path, self.display_size))
+
+    def is_ready(self, frame):
+        """
+        Check whether a frame is decoded and can be shown without waiting.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - bool, True if the frame is decoded
+        """
+        with self.lock:
+            future = self.futures.get(frame)
+        if future is not None and future.done():
+            return True
+        # Frames without an image are black, which takes no decoding
+        return self.image_files[frame] is None or self.cached(frame) is not None
+
+    def get(self, frame):
+        """
+        Get the display-size image of a frame.
+
+        A frame that is not decoded yet is waited for (or decoded right away
+        if it was never requested) and counted as a miss.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - img: PIL Image object, shared with the prefetcher (copy before drawing)
+        """
+        with self.lock:
+            future = self.futures.get(frame)
+            if future is not None and future.done():
+                self.hits += 1
+                return future.result()
+        img = self.cached(frame)
+        with self.lock:
+            if img is not None:
+                self.hits += 1
+                return img
+            self.misses += 1
+        if future is None:
+            # Decode on this thread rather than queue behind prefetched frames
+            return self.decode(frame)
+        return future.result()
+
+    def prefetch(self, frame, step=1):
+        """
+        Decode the frames around a frame in the background.
+
+        Frames outside the new window are dropped, and their decoding is
+        cancelled if it has not started yet.
+
+        Parameters:
+        - frame: int, the current frame number
+        - step: int, the frame step of the current direction (e.g. 1, -1, 10)
+
+        Returns:
+        None
+        """
+        last_frame = len(self.image_files) - 1
+        window = [frame]
+        window += [frame + step * i for i in range(1, self.depth + 1)]
+        window += [frame - step * i for i in range(1, self.behind + 1)]
+        window = [f for f in window if 1 <= f <= last_frame]
+
+        with self.lock:
+            keep = set(window)
+            for f in list(self.futures):
+                if f not in keep:
+                    self.futures.pop(f).cancel()
+            # Nearest frames first, since the pool works in submission order
+            for f in window:
+                if f not in self.futures:
+                    self.futures[f] = self.executor.submit(self.decode, f)
+
+    def stats(self):
+        """
+        Get the prefetch counters.
+
+        Parameters:
+        None
+
+        Returns:
+        - stats: dict, hits, misses and hit rate of get()
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
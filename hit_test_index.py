@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+# Per-frame uniform grid over the bounding boxes of an AnnotationStore:
+# - Each grid cell lists the boxes overlapping it, in drawing order.
+# - Grids are built the first time a frame is hit-tested and kept in an LRU.
+# All coordinates are in original image pixels.
+
+
+class HitTestIndex:
+    # Side of a grid cell, in original image pixels
+    CELL_SIZE = 64
+    # Number of frame grids kept in memory
+    MAX_CACHED_FRAMES = 256
+
+    def __init__(
+        self, annotation_store, cell_size=CELL_SIZE, max_cached_frames=MAX_CACHED_FRAMES
+    ):
+        self.annotation_store = annotation_store
+        self.cell_size = cell_size
+        self.max_cached_frames = max_cached_frames
+        self.frame_grids = OrderedDict()  # frame -> (boxes, cells), LRU order
+
+    def frame_grid(self, frame):
+        """
+        Get the grid of a frame, building it on first use.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - boxes: np.ndarray, ANNOTATION_DTYPE rows of the frame in drawing order
+        - cells: dict, (cell_x, cell_y) to the indexes of the boxes overlapping it
+        """
+        frame = int(frame)
+        if frame in self.frame_grids:
+            self.frame_grids.move_to_end(frame)
+            return self.frame_grids[frame]
+
+        boxes = self.annotation_store.frame_boxes(frame)
+        cells = {}
+        first_x = (boxes["x"] // self.cell_size).tolist()
+        first_y = (boxes["y"] // self.cell_size).tolist()
+        last_x = ((boxes["x"] + boxes["w"]) // self.cell_size).tolist()
+        last_y = ((boxes["y"] + boxes["h"]) // self.cell_size).tolist()
+        for index in range(len(boxes)):
+            for cell_x in range(first_x[index], last_x[index] + 1):
+                for cell_y in range(first_y[index], last_y[index] + 1):
+                    cells.setdefault((cell_x, cell_y), []).append(index)
+
+        self.frame_grids[frame] = (boxes, cells)
+        while len(self.frame_grids) > self.max_cached_frames:
+            self.frame_grids.popitem(last=False)
+        return boxes, cells
+
+    def hit(self, frame, x, y, accept=None):
+        """
+        Find the topmost box under a point.
+
+        Parameters:
+        - frame: int, the frame number
+        - x: float, x-coordinate in original image pixels
+        - y: float, y-coordinate in original image pixels
+        - accept: callable, optional filter on the cow tag of a box
+
+        Returns:
+        - box: np.void, the ANNOTATION_DTYPE row drawn last under the point
+          among the accepted ones, or None
+        """
+        boxes, cells = self.frame_grid(frame)
+        cell = (int(x // self.cell_size), int(y // self.cell_size))
+        # Boxes drawn later are on top
+        for index in reversed(cells.get(cell, [])):
+            box = boxes[index]
+            if (
+                box["x"] <= x <= box["x"] + box["w"]
+                and box["y"] <= y <= box["y"] + box["h"]
+                and (accept is None or accept(int(box["cow_tag"])))
+            ):
+                return box
+        return None
@@ -0,0 +1,369 @@
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+
+from annotation_store import build_offsets, find_key
+
+# Columnar storage for the identification results file:
+# - 'rows': one structured array holding every (query, candidate) row, sorted by
+#   frame and grouped by query, candidates keeping their file (rank) order.
+# - 'frame_keys' / 'frame_offsets': per-frame offset index into 'rows'.
+# - 'query_offsets' / 'query_index': per-query offset index into 'rows', keyed by
+#   (frame, cow_tag, query_x, query_y, query_w, query_h).
+# The store itself maps frames to lists of rows, like the old dictionary did.
+# LazyIdentificationStore offers the same lookups but only records the byte
+# range of each frame's block, parsing frames when they are first visited.
+
+QUERY_FIELDS = ("frame", "cow_tag", "query_x", "query_y", "query_w", "query_h")
+
+IDENTIFICATION_DTYPE = np.dtype(
+    [
+        ("frame", np.int32),
+        ("cow_tag", np.int32),
+        ("query_x", np.int32),
+        ("query_y", np.int32),
+        ("query_w", np.int32),
+        ("query_h", np.int32),
+        ("cow_id", np.int32),
+        ("distance", np.float64),
+        ("top_10_frame", np.int32),
+        ("x", np.int32),
+        ("y", np.int32),
+        ("w", np.int32),
+        ("h", np.int32),
+    ]
+)
+
+
+def parse_identification_rows(source):
+    """
+    Parse identification result lines into a structured array.
+
+    Parameters:
+    - source: str or list, path to the identification results file, or its lines
+
+    Returns:
+    - rows: np.ndarray, IDENTIFICATION_DTYPE rows in file order
+    """
+    values = np.loadtxt(source, delimiter=",", usecols=range(13), ndmin=2)
+    rows = np.empty(len(values), dtype=IDENTIFICATION_DTYPE)
+    # Assigning the float columns truncates toward zero, like int(float(value))
+    for column, name in enumerate(IDENTIFICATION_DTYPE.names):
+        rows[name] = values[:, column]
+    return rows
+
+
+class IdentificationStore(Mapping):
+    """frame -> [(cow_tag, query_x, query_y, query_w, query_h, cow_id, distance, top_10_frame, x, y, w, h), ...]"""
+
+    # Arrays that fully describe a store, e.g. for the parse cache
+    ARRAY_NAMES = ("rows", "frame_keys", "frame_offsets", "query_offsets")
+
+    def __init__(self, arrays):
+        """
+        Wrap prebuilt store arrays.
+
+        Parameters:
+        - arrays: dict, one np.ndarray per name in ARRAY_NAMES
+        """
+        for name in self.ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.query_index = self.build_query_index()
+
+    @classmethod
+    def build(cls, rows):
+        """
+        Build the frame and query indexes over parsed identification rows.
+
+        Parameters:
+        - rows: np.ndarray, IDENTIFICATION_DTYPE rows in file order
+
+        Returns:
+        - store: IdentificationStore
+        """
+        arrays = {}
+        # Stable, so the candidates of a query keep their rank order
+        order = np.lexsort([rows[name] for name in reversed(QUERY_FIELDS)])
+        arrays["rows"] = rows[order]
+        arrays["frame_keys"], arrays["frame_offsets"] = build_offsets(
+            arrays["rows"]["frame"]
+        )
+        same_query = np.ones(max(len(rows) - 1, 0), dtype=bool)
+        for name in QUERY_FIELDS:
+            column = arrays["rows"][name]
+            same_query &= column[1:] == column[:-1]
+        query_start = np.concatenate(([True], ~same_query))[: len(rows)]
+        arrays["query_offsets"] = np.append(
+            np.flatnonzero(query_start), len(rows)
+        ).astype(np.int64)
+        return cls(arrays)
+
+    def build_query_index(self):
+        """
+        Map every query to the range of its candidate rows.
+
+        Returns:
+        - query_index: dict, (frame, cow_tag, query_x, query_y, query_w, query_h)
+          to (start, stop) in 'rows'
+        """
+        starts = self.query_offsets[:-1]
+        queries = self.rows[list(QUERY_FIELDS)][starts].tolist()
+        return dict(
+            zip(queries, zip(starts.tolist(), self.query_offsets[1:].tolist()))
+        )
+
+    def to_arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+
+    def frame_rows(self, frame):
+        """
+        Get the identification rows of a frame.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - rows: np.ndarray, IDENTIFICATION_DTYPE rows grouped by query (empty if none)
+        """
+        index = find_key(self.frame_keys, frame)
+        if index < 0:
+            return self.rows[:0]
+        return self.rows[self.frame_offsets[index] : self.frame_offsets[index + 1]]
+
+    def candidates(self, frame, cow_tag, query_bbox, excluded_ids=()):
+        """
+        Get the ranked database candidates of one query cow.
+
+        Parameters:
+        - frame: int, the frame number of the query
+        - cow_tag: int, the tag of the query cow
+        - query_bbox: tuple, (x, y, w, h) of the query cow
+        - excluded_ids: list, database cow IDs to leave out (e.g. confirmed IDs)
+
+        Returns:
+        - candidates: np.ndarray, IDENTIFICATION_DTYPE rows in rank order
+        """
+        key = (int(frame), int(cow_tag)) + tuple(int(value) for value in query_bbox)
+        start, stop = self.query_index.get(key, (0, 0))
+        candidates = self.rows[start:stop]
+        if len(excluded_ids):
+            candidates = candidates[~np.isin(candidates["cow_id"], excluded_ids)]
+        return candidates
+
+    def __getitem__(self, frame):
+        if find_key(self.frame_keys, frame) < 0:
+            raise KeyError(frame)
+        rows = self.frame_rows(frame)
+        columns = [rows[name].tolist() for name in IDENTIFICATION_DTYPE.names[1:]]
+        return list(zip(*columns))
+
+    def __contains__(self, frame):
+        return find_key(self.frame_keys, frame) >= 0
+
+    def __iter__(self):
+        return iter(self.frame_keys.tolist())
+
+    def __len__(self):
+        return len(self.frame_keys)
+
+
+class LazyIdentificationStore(Mapping):
+    """frame -> rows, like IdentificationStore, parsing frames on first access"""
+
+    # Arrays that fully describe the byte-range index, e.g. for the parse cache
+    ARRAY_NAMES = ("frame_keys", "span_offsets", "span_starts", "span_stops")
+    # Bytes read at a time while scanning for frame blocks
+    SCAN_CHUNK_SIZE = 1 << 24
+    # Number of parsed frames kept in memory
+    DEFAULT_MAX_CACHED_FRAMES = 64
+    # Longest first field compared byte by byte while scanning
+    MAX_FRAME_FIELD_LENGTH = 24
+
+    def __init__(self, file_path, arrays, max_cached_frames=DEFAULT_MAX_CACHED_FRAMES):
+        """
+        Wrap a byte-range index of an identification results file.
+
+        Parameters:
+        - file_path: str, path to the identification results file
+        - arrays: dict, one np.ndarray per name in ARRAY_NAMES (see scan)
+        - max_cached_frames: int, number of parsed frames kept in the LRU
+        """
+        self.file_path = file_path
+        for name in self.ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.max_cached_frames = max_cached_frames
+        self.parsed_frames = OrderedDict()  # frame -> IdentificationStore, LRU order
+        self.lock = threading.Lock()
+        self.file = None
+
+    @classmethod
+    def scan(cls, file_path):
+        """
+        Record the byte ranges of every frame's block in one pass.
+
+        Lines are found with NumPy on large chunks; only lines whose first
+        field differs from the previous line's are parsed in Python, so the
+        cost is one read of the file plus one int() per block.
+
+        Parameters:
+        - file_path: str, path to the identification results file
+
+        Returns:
+        - arrays: dict, frame_keys (sorted frames), span_offsets (spans of
+          frame_keys[i] are span_offsets[i]:span_offsets[i + 1]), and
+          span_starts / span_stops (byte ranges of the spans)
+        """
+        spans = []  # [frame, start, stop], in file order
+        with open(file_path, "rb") as file:
+            position = 0  # file offset of buffer[0]
+            carry = b""
+            while True:
+                chunk = file.read(cls.SCAN_CHUNK_SIZE)
+                buffer = carry + chunk
+                if not chunk:
+                    if buffer.strip():
+                        cls.scan_block(buffer + b"\n", position, spans)
+                    break
+                block_length = buffer.rfind(b"\n") + 1
+                cls.scan_block(buffer[:block_length], position, spans)
+                carry = buffer[block_length:]
+                position += block_length
+
+        spans = np.array(spans, dtype=np.int64).reshape(-1, 3)
+        order = np.argsort(spans[:, 0], kind="stable")
+        spans = spans[order]
+        frame_keys, span_offsets = build_offsets(spans[:, 0])
+        return {
+            "frame_keys": frame_keys,
+            "span_offsets": span_offsets,
+            "span_starts": spans[:, 1].copy(),
+            "span_stops": spans[:, 2].copy(),
+        }
+
+    @classmethod
+    def scan_block(cls, block, position, spans):
+        """
+        Append the frame spans of a block of complete lines.
+
+        Parameters:
+        - block: bytes, complete lines (ending with a newline)
+        - position: int, file offset of the block
+        - spans: list, [frame, start, stop] entries to extend
+
+        Returns:
+        None
+        """
+        if not block:
+            return
+        data = np.frombuffer(block, dtype=np.uint8)
+        line_stops = np.flatnonzero(data == ord("\n")) + 1
+        line_starts = np.concatenate(([0], line_stops[:-1]))
+        commas = np.append(np.flatnonzero(data == ord(",")), len(data))
+        field_stops = commas[np.searchsorted(commas, line_starts)]
+
+        # Blank lines (no comma before the end of the line) carry no row
+        has_row = field_stops < line_stops
+        line_starts = line_starts[has_row]
+        line_stops = line_stops[has_row]
+        field_stops = field_stops[has_row]
+        if len(line_starts) == 0:
+            return
+
+        # A new block starts where the first field differs from the line before
+        field_lengths = field_stops - line_starts
+        width = min(int(field_lengths.max()), cls.MAX_FRAME_FIELD_LENGTH)
+        character_index = line_starts[:, None] + np.arange(width)[None, :]
+        fields = np.where(
+            np.arange(width)[None, :] < field_lengths[:, None],
+            data[np.minimum(character_index, len(data) - 1)],
+            0,
+        )
+        changed = np.ones(len(line_starts), dtype=bool)
+        changed[1:] = (field_lengths[1:] != field_lengths[:-1]) | np.any(
+            fields[1:] != fields[:-1], axis=1
+        )
+        run_starts = np.flatnonzero(changed)
+        run_stops = np.append(run_starts[1:], len(line_starts)) - 1
+
+        for first, last in zip(run_starts.tolist(), run_stops.tolist()):
+            frame = int(float(block[line_starts[first] : field_stops[first]]))
+            start = position + int(line_starts[first])
+            stop = position + int(line_stops[last])
+            if spans and spans[-1][0] == frame and spans[-1][2] == start:
+                spans[-1][2] = stop
+            else:
+                spans.append([frame, start, stop])
+
+    def to_arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+
+    def frame_store(self, frame):
+        """
+        Get the parsed rows of a frame, parsing and caching them if needed.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - store: IdentificationStore holding only this frame, or None if the
+          frame has no rows
+        """
+        index = find_key(self.frame_keys, frame)
+        if index < 0:
+            return None
+        frame = int(frame)
+        with self.lock:
+            if frame in self.parsed_frames:
+                self.parsed_frames.move_to_end(frame)
+                return self.parsed_frames[frame]
+
+            if self.file is None:
+                self.file = open(self.file_path, "rb")
+            lines = []
+            for span in range(self.span_offsets[index], self.span_offsets[index + 1]):
+                start = int(self.span_starts[span])
+                self.file.seek(start)
+                block = self.file.read(int(self.span_stops[span]) - start)
+                lines.extend(block.decode().splitlines())
+            store = IdentificationStore.build(parse_identification_rows(lines))
+
+            self.parsed_frames[frame] = store
+            while len(self.parsed_frames) > self.max_cached_frames:
+                self.parsed_frames.popitem(last=False)
+            return store
+
+    def frame_rows(self, frame):
+        store = self.frame_store(frame)
+        if store is None:
+            return np.zeros(0, dtype=IDENTIFICATION_DTYPE)
+        return store.rows
+
+    def candidates(self, frame, cow_tag, query_bbox, excluded_ids=()):
+        store = self.frame_store(frame)
+        if store is None:
+            return np.zeros(0, dtype=IDENTIFICATION_DTYPE)
+        return store.candidates(frame, cow_tag, query_bbox, excluded_ids)
+
+    def __getitem__(self, frame):
+        store = self.frame_store(frame)
+        if store is None:
+            raise KeyError(frame)
+        return store[frame]
+
+    def __contains__(self, frame):
+        return find_key(self.frame_keys, frame) >= 0
+
+    def __iter__(self):
+        return iter(self.frame_keys.tolist())
+
+    def __len__(self):
+        return len(self.frame_keys)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
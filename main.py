@@ -12,6 +12,12 @@ from PIL import Image, ImageTk, ImageDraw
 # Local Imports
 from time_tracker import TimeTracker
 from annotations_loader import AnnotationsLoader
+from parse_cache import ParseCache
+from frame_cache import FrameCache
+from frame_catalog import FrameCatalog
+from decode_service import DecodeService
+from crop_atlas import CropAtlas
+from thumbnail_store import ThumbnailStore
 from video_player import VideoPlayer
 from multi_view_window import MultiViewWindow
 from top_k_view_window import TopkViewWindow
@@ -72,6 +78,8 @@ class CowApp:
 
         self.root = root
         self.root.withdraw()
+        # Stop the background workers when the window is closed
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
         self.time_tracker = TimeTracker()
         self.app_state = ApplicationState(self.config)
         self.evalation_mode = False
@@ -84,18 +92,32 @@ class CowApp:
             # The evaluation mode is off
             pass
 
+        # Number of decoding processes for the crop panes (0: decode in-process)
+        self.decode_workers = args.decode_workers
+
         # Load annotations
-        annotations_loader = AnnotationsLoader()
-        (
-            self.annotations,
-            self.individual_cow_annotations,
-            self.nearest_bbox_per_cow,
-        ) = annotations_loader.load_annotations(self.config.ANNOTATION_FILE)
-        self.individual_identification_annotations = (
-            annotations_loader.load_individual_identification_annotations(
-                self.config.IDENTIFICATION_FILE
-            )
+        annotations_loader = AnnotationsLoader(ParseCache(), os.cpu_count() or 1)
+        self.annotation_store = annotations_loader.load_annotation_store(
+            self.config.ANNOTATION_FILE
         )
+        self.annotations = self.annotation_store.annotations
+        self.individual_cow_annotations = (
+            self.annotation_store.individual_cow_annotations
+        )
+        self.nearest_bbox_per_cow = self.annotation_store.nearest_bbox_per_cow
+        if args.lazy_identification:
+            # Parse identification rows only for the frames that are visited
+            self.individual_identification_annotations = (
+                annotations_loader.load_lazy_identification_annotations(
+                    self.config.IDENTIFICATION_FILE
+                )
+            )
+        else:
+            self.individual_identification_annotations = (
+                annotations_loader.load_individual_identification_annotations(
+                    self.config.IDENTIFICATION_FILE
+                )
+            )
         self.name_input_window = NameInputWindow(
             root,
             self.user_name,
@@ -130,6 +152,39 @@ class CowApp:
         print("Width:", root.winfo_width())
         print("Height:", root.winfo_height())
 
+        # Decoded frames shared by the video player, multi-view and top-k panes
+        self.frame_cache = FrameCache(
+            getattr(self.config, "FRAME_CACHE_BYTES", FrameCache.DEFAULT_MAX_BYTES),
+            getattr(
+                self.config,
+                "DRAFT_DECODE_TOLERANCE",
+                FrameCache.DEFAULT_DRAFT_TOLERANCE,
+            ),
+        )
+
+        # Frame numbering of the image directories, scanned once for all panes
+        self.frame_catalog = FrameCatalog()
+
+        # Worker processes decoding the multi-view and top-k crops in parallel
+        self.decode_service = None
+        if self.decode_workers:
+            self.decode_service = DecodeService(self.decode_workers)
+
+        # Per-cow crops for the selected cow and multi-view panes, if built
+        self.crop_atlas = CropAtlas.load(
+            self.config.IMAGE_DIR, self.config.ANNOTATION_FILE
+        )
+
+        # Top-10 tiles kept on disk, filled as the grid is shown, and trimmed
+        # to its budget once per launch
+        self.thumbnail_store = ThumbnailStore(
+            self.config.DATABASE_IMAGE_DIR,
+            max_bytes=getattr(
+                self.config, "THUMBNAIL_STORE_BYTES", ThumbnailStore.DEFAULT_MAX_BYTES
+            ),
+        )
+        self.thumbnail_store.trim()
+
         ###multi-view window and video(Left)###
         self.left_canvas = tk.Canvas(root)
         self.left_canvas.pack(side=tk.LEFT, fill=tk.BOTH)
@@ -143,6 +198,10 @@ class CowApp:
             self.app_state,
             self.time_tracker,
             self.main_change_change_image_by_frame,
+            self.frame_cache,
+            self.frame_catalog,
+            self.decode_service,
+            self.crop_atlas,
         )
 
         self.video_player = VideoPlayer(
@@ -152,10 +211,13 @@ class CowApp:
             self.annotations,
             self.individual_cow_annotations,
             self.nearest_bbox_per_cow,
+            self.annotation_store,
             self.show_all_windows,
             self.save_all_histories_and_ids,
             self.app_state,
             self.time_tracker,
+            self.frame_cache,
+            self.frame_catalog,
         )
 
         right_canvas = tk.Canvas(root)
@@ -171,6 +233,10 @@ class CowApp:
             self.app_state,
             self.time_tracker,
             self.hide_bounding_box,
+            self.frame_cache,
+            self.frame_catalog,
+            self.decode_service,
+            self.thumbnail_store,
         )
         if self.app_state.get_evaluation_mode() != True:
             self.cheat_mode = CheatMode(
@@ -197,6 +263,28 @@ class CowApp:
 
         self.time_tracker.start_or_resume_timer(0)
 
+    def close(self):
+        """
+        Stop the background workers, then close the window.
+
+        Their threads would otherwise keep working through the queued
+        frames before the interpreter can exit.
+
+        Parameters:
+        None
+
+        Returns:
+        None
+        """
+        # The panes only exist once the main app has been started
+        if hasattr(self, "video_player"):
+            self.video_player.close()
+        if hasattr(self, "top_k_view_window"):
+            self.top_k_view_window.close()
+        if getattr(self, "decode_service", None) is not None:
+            self.decode_service.close()
+        self.root.destroy()
+
     ###keyboard Shortcuts###
     def key_pressed(self, event, *args):
         if event.keysym == "space":
@@ -214,6 +302,12 @@ class CowApp:
         elif event.keysym == "comma":
             self.time_tracker.record_key_press(event.keysym)
             self.video_player.change_image("previous")
+        elif event.keysym == "bracketleft":
+            self.time_tracker.record_key_press(event.keysym)
+            self.video_player.change_playback_speed(-1)
+        elif event.keysym == "bracketright":
+            self.time_tracker.record_key_press(event.keysym)
+            self.video_player.change_playback_speed(1)
         elif event.keysym == "Escape":
             self.time_tracker.record_key_press(event.keysym)
             self.multi_view_window.deselect_cow()
@@ -404,6 +498,21 @@ if __name__ == "__main__":
         help="Select the configuration type",
     )
 
+    parser.add_argument(
+        "--lazy_identification",
+        dest="lazy_identification",
+        action="store_true",
+        help="Parse the identification file lazily, one frame at a time",
+    )
+
+    parser.add_argument(
+        "--decode_workers",
+        dest="decode_workers",
+        type=int,
+        default=0,
+        help="Decode the multi-view and top-k crops in this many processes",
+    )
+
     # Add the window type argument
     parser.add_argument(
         "--window",
@@ -1,4 +1,3 @@
-import os
 import tkinter as tk
 import tkinter.font as tkFont
 from PIL import Image, ImageTk, ImageDraw
@@ -7,6 +6,9 @@ import numpy as np
 import random
 
 # Local imports
+from decode_service import crop_frames, preview_crops
+from photo_pool import PhotoImagePool
+from progressive_render import ProgressiveRender
 from time_tracker import TimeTracker
 
 
@@ -21,6 +23,10 @@ class MultiViewWindow:
         app_state,
         time_tracker,
         main_change_change_image_by_frame,
+        frame_cache,
+        frame_catalog,
+        decode_service=None,
+        crop_atlas=None,
     ):
         # Local imports
         self.config = config
@@ -31,13 +37,21 @@ class MultiViewWindow:
         self.app_state = app_state
         self.main_change_change_image_by_frame = main_change_change_image_by_frame
         self.time_tracker = time_tracker
+        self.frame_cache = frame_cache
+        self.decode_service = decode_service
+        # Crops extracted offline by crop_atlas.py, read instead of the frames
+        self.crop_atlas = crop_atlas
         self.multi_window_canvas = None
         self.selected_cow_label = {}
         self.multi_window = {}
         self.multi_view_labels = {}
+        # One PhotoImage per label (selected cow and views), updated in place
+        self.photo_pool = PhotoImagePool()
 
-        self.image_files = self.get_sorted_image_files(self.config.IMAGE_DIR)
+        self.image_files = frame_catalog.frames(self.config.IMAGE_DIR)
         self.setup_multi_window(left_canvas)
+        # Quick previews of the views first, then the full-quality crops
+        self.progressive_render = ProgressiveRender(self.multi_window_canvas)
 
     def setup_multi_window(self, left_canvas):
         self.multi_window_canvas = tk.Frame(left_canvas)
@@ -95,11 +109,43 @@ class MultiViewWindow:
         Returns:
         - cropped_img: PIL Image object, cropped image
         """
+        return self.crop_images([frame_number], tool_number)[0]
 
-        def find_coordinates_and_image_path():
-            x1, y1, x2, y2 = None, None, None, None
-            selected_cow = self.app_state.get_selected_cow()
-            if frame_number in self.nearest_bbox_per_cow[selected_cow]:
+    def crop_images(self, frame_numbers, tool_number, preview=False):
+        """
+        Crop the images of the selected cow in several frames at once.
+
+        Crops found in the crop atlas are read from it. For the others,
+        with a decode service, the frames are decoded in parallel by its
+        worker processes instead of one after the other.
+
+        Parameters:
+        - frame_numbers: list, the frame numbers for which to crop the image
+        - tool_number: int, the tool number (0:selected_cow, 1:multi_view_window)
+        - preview: bool, True for quick, low-quality crops
+
+        Returns:
+        - cropped_imgs: list, PIL Image objects in the order of the frames
+        """
+        if tool_number == 0:
+            boundaries = 25
+            line_width = 4
+        elif tool_number == 1:
+            boundaries = 10
+            line_width = 3
+
+        selected_cow = self.app_state.get_selected_cow()
+        # The atlas crops hold margins up to crop_atlas.margin
+        use_atlas = (
+            self.crop_atlas is not None and boundaries <= self.crop_atlas.margin
+        )
+        jobs = []
+        atlas_crops = {}  # position in frame_numbers -> crop read from the atlas
+        for position, frame_number in enumerate(frame_numbers):
+            if (
+                frame_number in self.nearest_bbox_per_cow[selected_cow]
+                and frame_number in self.image_files
+            ):
                 distance, annotation = self.nearest_bbox_per_cow[selected_cow][
                     frame_number
                 ]
@@ -107,68 +153,66 @@ class MultiViewWindow:
                     self.app_state.save_selected_cow_annotation(annotation)
                 # print("distance: ", distance), print("annotation: ", annotation)
                 x, y, w, h = annotation
-                x1 = x
-                y1 = y
-                x2 = x + w
-                y2 = y + h
-                img_path = self.image_files[frame_number]
-                img = Image.open(img_path)
-                img_width, img_height = img.size
-
-                # Add a margin, checking that we don't go out of image boundaries
-                x1 = max(0, x1 - boundaries)
-                y1 = max(0, y1 - boundaries)
-                x2 = min(img_width, x2 + boundaries)
-                y2 = min(img_height, y2 + boundaries)
-
-                # Crop the image
-                cropped_img = img.crop((x1, y1, x2, y2))
-                return (x1, y1, x2, y2, cropped_img)
+                # Add a margin; crop_frames keeps the box inside the image
+                box = (
+                    x - boundaries,
+                    y - boundaries,
+                    x + w + boundaries,
+                    y + h + boundaries,
+                )
+                atlas_crop = None
+                if use_atlas:
+                    atlas_crop = self.crop_atlas.crop(selected_cow, frame_number, box)
+                if atlas_crop is not None:
+                    # Cut out offline: no full frame to decode
+                    atlas_crops[position] = atlas_crop
+                    jobs.append((None, None))
+                else:
+                    jobs.append((self.image_files[frame_number], box))
             else:
-                x1 = 0
-                y1 = 0
-                x2 = 0
-                y2 = 0
-                img_path = self.config.SELECTED_COW_NO_PHOTO
-                img = Image.open(img_path)
-                return (x1, y1, x2, y2, img)
+                jobs.append((None, None))
+        if preview:
+            cropped_imgs = preview_crops(jobs, self.frame_cache)
+        else:
+            cropped_imgs = crop_frames(jobs, self.frame_cache, self.decode_service)
+        for position, atlas_crop in atlas_crops.items():
+            cropped_imgs[position] = atlas_crop
 
-        if tool_number == 0:
-            boundaries = 25
-            line_width = 4
-            x1, y1, x2, y2, cropped_img = find_coordinates_and_image_path()
-            if x1 == 0 and y1 == 0 and x2 == 0 and y2 == 0:
-                self.app_state.set_selected_cow_exist(False)
-            else:
+        for i, cropped_img in enumerate(cropped_imgs):
+            if cropped_img is None:
+                cropped_imgs[i] = Image.open(self.config.SELECTED_COW_NO_PHOTO)
+                if tool_number == 0:
+                    self.app_state.set_selected_cow_exist(False)
+                continue
+            if tool_number == 0:
                 self.app_state.set_selected_cow_exist(True)
 
-        elif tool_number == 1:
-            boundaries = 10
-            line_width = 3
-            x1, y1, x2, y2, cropped_img = find_coordinates_and_image_path()
-
-        # Draw the bounding box on the cropped image in red
-        draw = ImageDraw.Draw(cropped_img, "RGBA")
-        if (tool_number == 0 and x1 != 0) or (
-            self.app_state.display_bounding_boxes and x1 != 0
-        ):
-            self.draw_rectangle_crop_image(
-                draw,
-                boundaries,
-                boundaries,
-                x2 - x1 - boundaries,
-                y2 - y1 - boundaries,
-                255,
-                0,
-                0,
-                170,
-                line_width,
-            )
+            # Draw the bounding box on the cropped image in red
+            draw = ImageDraw.Draw(cropped_img, "RGBA")
+            if tool_number == 0 or self.app_state.display_bounding_boxes:
+                self.draw_rectangle_crop_image(
+                    draw,
+                    boundaries,
+                    boundaries,
+                    cropped_img.width - boundaries,
+                    cropped_img.height - boundaries,
+                    255,
+                    0,
+                    0,
+                    170,
+                    line_width,
+                )
 
-        return cropped_img
+        return cropped_imgs
 
     def resize_and_center(
-        self, image, frame_width, frame_height, background_color="#ECD9D9"
+        self,
+        image,
+        frame_width,
+        frame_height,
+        background_color="#ECD9D9",
+        resample=Resampling.LANCZOS,
+        slot=None,
     ):
         """
         Resize and center the image within the given frame dimensions.
@@ -178,9 +222,12 @@ class MultiViewWindow:
         - frame_width: int, the width of the frame
         - frame_height: int, the height of the frame
         - background_color: str, the background color
+        - resample: PIL resampling filter (BILINEAR for quick previews)
+        - slot: hashable, the label slot whose PhotoImage is updated in place,
+          or None for a new PhotoImage
 
         Returns:
-        - PIL Image object, resized and centered
+        - ImageTk.PhotoImage object, resized and centered
         """
         image_aspect_ratio = float(image.width / image.height)
         if image.width / frame_width > image.height / frame_height:
@@ -189,29 +236,25 @@ class MultiViewWindow:
         else:
             new_height = frame_height
             new_width = int(frame_height * image_aspect_ratio)
-        new_image = image.resize((new_width, new_height), Resampling.LANCZOS)
+        new_image = image.resize((new_width, new_height), resample)
 
-        background = Image.new("RGB", (frame_width, frame_height), background_color)
+        if slot is None:
+            background = Image.new(
+                "RGB", (frame_width, frame_height), background_color
+            )
+        else:
+            background = self.photo_pool.background(
+                slot, (frame_width, frame_height), background_color
+            )
 
         paste_x = (frame_width - new_width) // 2
         paste_y = (frame_height - new_height) // 2
         background.paste(new_image, (paste_x, paste_y))
-        return ImageTk.PhotoImage(background)
+        if slot is None:
+            return ImageTk.PhotoImage(background)
+        return self.photo_pool.photo(slot, background)
 
     ###multi-view window ###
-    def get_sorted_image_files(self, directory):
-        # Get a list of all image files in the directory
-        image_files = [
-            os.path.join(directory, f)
-            for f in os.listdir(directory)
-            if f.endswith(".jpg")
-        ]
-        # Sort the images by filename
-        image_files = sorted(image_files)
-        # Insert a dummy element at the beginning to make the index start from 1
-        image_files.insert(0, None)
-        return image_files
-
     def default_selected_image(self):
         # Open and resize the image
         image = Image.open(self.config.SELECTED_COW_DEFAULT)
@@ -220,6 +263,7 @@ class MultiViewWindow:
             self.config.SELECTED_COW_FRAME_WIDTH,
             self.config.SELECTED_COW_FRAME_HEIGHT,
             "#FFE4AF",
+            slot="selected_cow",
         )
 
         self.label_3 = tk.Label(
@@ -262,6 +306,7 @@ class MultiViewWindow:
                 self.config.MULTI_WINDOW_FRAME_WIDTH,
                 self.config.MULTI_WINDOW_FRAME_HEIGHT,
                 "#97C8F5",
+                slot=("multi_view", j),
             )
 
             self.label_2 = tk.Label(
@@ -391,6 +436,7 @@ class MultiViewWindow:
             self.config.SELECTED_COW_FRAME_WIDTH,
             self.config.SELECTED_COW_FRAME_HEIGHT,
             "#FFE4AF",
+            slot="selected_cow",
         )
 
         # Update the label and photo in the dictionary
@@ -408,7 +454,6 @@ class MultiViewWindow:
 
     def show_multi_view_window(self):
         # Clear any existing frames and find cows to show in multi-view
-        view_cow = 0
         selected_tracklets = self.find_multiview_cow()
         selected_cow = self.app_state.get_selected_cow()
 
@@ -417,6 +462,35 @@ class MultiViewWindow:
             # Loop through available views
             selected_cow = self.app_state.get_selected_cow()
 
+        if selected_cow:
+            self.progressive_render.render(
+                lambda: self.show_multi_view_images(multi_view_cows, preview=True),
+                lambda: self.show_multi_view_images(multi_view_cows),
+            )
+        else:
+            self.progressive_render.cancel()
+            self.show_multi_view_images(None)
+
+    def show_multi_view_images(self, multi_view_cows, preview=False):
+        """
+        Show the three views of the selected cow, or the default images.
+
+        Parameters:
+        - multi_view_cows: list, frame numbers of the views, or None
+        - preview: bool, True for quick, low-quality images
+
+        Returns:
+        None
+        """
+        view_cow = 0
+        selected_cow = multi_view_cows is not None
+        resample = Resampling.BILINEAR if preview else Resampling.LANCZOS
+        if selected_cow:
+            # Crop the three views at once
+            new_images = self.crop_images(
+                multi_view_cows[:3], tool_number=1, preview=preview
+            )
+
         for i in range(1, 4):
             if selected_cow:
                 frame = multi_view_cows[i - 1]
@@ -424,8 +498,7 @@ class MultiViewWindow:
                 self.multi_window[i - 1] = frame
                 minutes, seconds = divmod(frame, 60)
 
-                # Crop image using function
-                new_image = self.crop_image(frame_number=frame, tool_number=1)
+                new_image = new_images[i - 1]
                 view_cow += 1
             else:
                 new_image = Image.open(self.config.MULTI_WINDOW_DEFAULT)
@@ -435,6 +508,8 @@ class MultiViewWindow:
                 self.config.MULTI_WINDOW_FRAME_WIDTH,
                 self.config.MULTI_WINDOW_FRAME_HEIGHT,
                 "#97C8F5",
+                resample,
+                slot=("multi_view", i),
             )
 
             # Update the label and photo in the dictionary
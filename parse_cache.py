@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+# Persistent cache of parsed text files:
+# - One entry directory per (source file, kind) under the cache directory.
+# - 'meta.json' records the source path, size, mtime and content hash.
+# - Each parsed array is stored as a '.npy' file and memory-mapped on load.
+
+DEFAULT_CACHE_DIR = "cache"
+
+
+class ParseCache:
+    # Bump when the layout of cached arrays changes
+    FORMAT_VERSION = 3
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = os.path.join(cache_dir, "parse")
+
+    def content_hash(self, file_path):
+        """
+        Hash the content of a file.
+
+        Parameters:
+        - file_path: str, path to the file
+
+        Returns:
+        - digest: str, hex digest of the file content
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 22), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def entry_dir(self, file_path, kind):
+        path_hash = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{path_hash[:16]}-{kind}")
+
+    def read_meta(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, "meta.json"), "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def write_meta(self, entry_dir, meta):
+        temp_path = os.path.join(entry_dir, f"meta.json.{os.getpid()}")
+        with open(temp_path, "w") as file:
+            json.dump(meta, file)
+        os.replace(temp_path, os.path.join(entry_dir, "meta.json"))
+
+    def load(self, file_path, kind, build):
+        """
+        Load parsed arrays for a file, parsing it only if the cache is stale.
+
+        The entry is fresh if the source path, size and mtime match. If only
+        the size or mtime changed, the content hash decides whether the
+        cached arrays can still be used.
+
+        Parameters:
+        - file_path: str, path to the source text file
+        - kind: str, name of what is parsed from it (e.g. "annotations")
+        - build: callable, parses the file and returns a dict of np.ndarray
+
+        Returns:
+        - arrays: dict, name to np.ndarray (memory-mapped when loaded from cache)
+        """
+        entry_dir = self.entry_dir(file_path, kind)
+        stat = os.stat(file_path)
+        meta = self.read_meta(entry_dir)
+        content_hash = None
+        fresh = False
+        if meta is not None and meta["version"] == self.FORMAT_VERSION:
+            if meta["size"] == stat.st_size and meta["mtime_ns"] == stat.st_mtime_ns:
+                fresh = True
+            else:
+                content_hash = self.content_hash(file_path)
+                if content_hash == meta["content_hash"]:
+                    # Touched but unchanged: refresh the stat part of the key
+                    meta["size"] = stat.st_size
+                    meta["mtime_ns"] = stat.st_mtime_ns
+                    try:
+                        self.write_meta(entry_dir, meta)
+                    except OSError:
+                        pass
+                    fresh = True
+
+        if fresh:
+            try:
+                arrays = {
+                    name: np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode="r")
+                    for name in meta["arrays"]
+                }
+                print(f"Loaded {kind} of {file_path} from the parse cache")
+                return arrays
+            except (OSError, ValueError):
+                pass
+
+        print(f"Parsing {file_path} ({kind})")
+        arrays = build()
+        if content_hash is None:
+            content_hash = self.content_hash(file_path)
+        self.store(entry_dir, file_path, stat, content_hash, arrays)
+        return arrays
+
+    def store(self, entry_dir, file_path, stat, content_hash, arrays):
+        """
+        Write parsed arrays to a cache entry.
+
+        The arrays are written to a temporary directory that replaces the
+        entry only once complete, so a crash never leaves a half entry.
+
+        Parameters:
+        - entry_dir: str, the cache entry directory
+        - file_path: str, path to the source text file
+        - stat: os.stat_result, stat of the source when it was parsed
+        - content_hash: str, hash of the source content
+        - arrays: dict, name to np.ndarray
+
+        Returns:
+        None
+        """
+        temp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+        try:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            os.makedirs(temp_dir)
+            for name, array in arrays.items():
+                np.save(os.path.join(temp_dir, f"{name}.npy"), array)
+            self.write_meta(
+                temp_dir,
+                {
+                    "version": self.FORMAT_VERSION,
+                    "path": os.path.abspath(file_path),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "content_hash": content_hash,
+                    "arrays": list(arrays),
+                },
+            )
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(temp_dir, entry_dir)
+        except OSError as error:
+            # The cache is only an accelerator; keep going without it
+            print(f"Could not write the parse cache for {file_path}: {error}")
+            shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,165 @@
+import argparse
+import time
+import tkinter as tk
+import tracemalloc
+
+from PIL import Image, ImageTk
+
+# Reuse of the Tk images of the fixed-size panes:
+# - Each label slot (a top-10 tile, a multi-view image, the video frame)
+#   keeps one PhotoImage, updated in place with PhotoImage.paste instead of
+#   being replaced by a new one on every update.
+# - The background each slot is composed on is kept too, and cleared with
+#   its color before the next image is centered on it.
+# - A new PhotoImage is only made when the size of a slot changes.
+
+
+class PhotoImagePool:
+    def __init__(self):
+        self.backgrounds = {}  # slot -> PIL image the slot is composed on
+        self.photos = {}  # slot -> ImageTk.PhotoImage shown in the slot
+        # PhotoImages made and updated in place, to see how much was reused
+        self.allocations = 0
+        self.updates = 0
+
+    def background(self, slot, size, color):
+        """
+        Get the background of a slot, cleared with a color.
+
+        Parameters:
+        - slot: hashable, the label slot (e.g. ("top10", 3))
+        - size: tuple, (width, height) of the slot
+        - color: str, the background color
+
+        Returns:
+        - background: PIL Image object, RGB, reused by the next call for the slot
+        """
+        background = self.backgrounds.get(slot)
+        if background is None or background.size != size:
+            background = Image.new("RGB", size, color)
+            self.backgrounds[slot] = background
+        else:
+            background.paste(color, (0, 0) + size)
+        return background
+
+    def photo(self, slot, img):
+        """
+        Get the PhotoImage of a slot, showing an image.
+
+        Parameters:
+        - slot: hashable, the label slot
+        - img: PIL Image object, the image to show
+
+        Returns:
+        - photo: ImageTk.PhotoImage, the same object as the last call for the
+          slot whenever the size has not changed
+        """
+        photo = self.photos.get(slot)
+        if photo is None or (photo.width(), photo.height()) != img.size:
+            photo = ImageTk.PhotoImage(img)
+            self.photos[slot] = photo
+            self.allocations += 1
+        else:
+            photo.paste(img)
+            self.updates += 1
+        return photo
+
+
+if __name__ == "__main__":
+    # Allocations per navigation step: one video frame and ten top-10 tiles
+    parser = argparse.ArgumentParser(
+        description="Compare new and pooled PhotoImages over navigation steps."
+    )
+    parser.add_argument("--steps", type=int, default=200, help="Navigation steps")
+    parser.add_argument(
+        "--tile", type=int, nargs=2, default=(300, 200), help="Tile width and height"
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Only compare the backgrounds, without Tk (also used without a display)",
+    )
+    args = parser.parse_args()
+
+    root = None
+    if not args.headless:
+        try:
+            root = tk.Tk()
+            root.withdraw()
+        except tk.TclError as error:
+            print(f"No display ({error}): comparing the backgrounds only")
+    frame_size = (1200, 675)
+    tile_size = tuple(args.tile)
+    sources = [
+        Image.new("RGB", (400 + 10 * i, 300 + 5 * i), (20 * i, 100, 200))
+        for i in range(11)
+    ]
+    labels = [None if root is None else tk.Label(root) for _ in range(11)]
+    pool = PhotoImagePool()
+
+    def compose(background, image):
+        image.thumbnail(background.size)
+        background.paste(
+            image,
+            (
+                (background.width - image.width) // 2,
+                (background.height - image.height) // 2,
+            ),
+        )
+        return background
+
+    def show_new(i, image, size):
+        # The old way: a new background and a new PhotoImage on every update
+        background = compose(Image.new("RGB", size, "#ECD9D9"), image)
+        if root is None:
+            return background
+        return ImageTk.PhotoImage(background)
+
+    def show_pooled(i, image, size):
+        background = compose(pool.background(i, size, "#ECD9D9"), image)
+        if root is None:
+            return background
+        return pool.photo(i, background)
+
+    def run(name, show):
+        shown = [None] * len(labels)  # Last Tk image, or background, per slot
+        made = 0  # Objects that are not the ones already shown in their slot
+
+        def step():
+            nonlocal made
+            for i, label in enumerate(labels):
+                size = frame_size if i == 0 else tile_size
+                image = show(i, sources[i].copy(), size)
+                if label is not None:
+                    label.config(image=image)
+                    label.image = image
+                made += image is not shown[i]
+                shown[i] = image
+
+        step()  # Warm up: the pool makes its PhotoImages here
+        made = 0
+        tracemalloc.start()
+        start_snapshot = tracemalloc.take_snapshot()
+        start_time = time.perf_counter()
+        for _ in range(args.steps):
+            step()
+        elapsed = time.perf_counter() - start_time
+        stats = tracemalloc.take_snapshot().compare_to(start_snapshot, "filename")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        kind = "backgrounds" if root is None else "Tk images"
+        print(
+            f"{name}: {elapsed / args.steps * 1000:.2f} ms/step, "
+            f"{made / args.steps:.1f} {kind} created/step, "
+            f"{sum(stat.count_diff for stat in stats) / args.steps:+.1f} "
+            f"live blocks/step, peak traced {peak / 1024:.0f} KiB"
+        )
+
+    run("new", show_new)
+    run("pooled", show_pooled)
+    if root is not None:
+        print(
+            f"Pool: {pool.allocations} PhotoImages made, "
+            f"{pool.updates} updated in place"
+        )
+        root.destroy()
@@ -0,0 +1,147 @@
+import time
+
+# Real-time playback for the video player:
+# - Frame deadlines are computed from a monotonic clock, so slow renders
+#   never stretch the playback time.
+# - When decoding falls behind, frames are skipped (counted as dropped)
+#   and the newest decoded frame that is due is shown instead.
+# - Speed multipliers change the frame rate without restarting playback,
+#   and frames picked by the user while playing restart the deadlines.
+
+
+class PlaybackScheduler:
+    # Speed multipliers selectable with the [ and ] keys
+    SPEEDS = (0.5, 1, 2, 4, 8, 16)
+    # Frame rate of the image sequence at 1x (frames are one second apart)
+    DEFAULT_FPS = 1.0
+    # Delay before checking again for a due frame still being decoded (ms)
+    POLL_INTERVAL = 10
+
+    def __init__(
+        self, root, get_frame, show, is_ready, last_frame, on_finish, fps=DEFAULT_FPS
+    ):
+        self.root = root
+        self.get_frame = get_frame
+        self.show = show
+        self.is_ready = is_ready
+        self.last_frame = last_frame
+        self.on_finish = on_finish
+        self.fps = fps
+        self.speed = 1
+        self.timer = None
+
+        # Timing of the current run
+        self.start_time = None
+        self.start_frame = None
+        self.frame = None
+        # Statistics of the current run
+        self.play_time = None
+        self.shown_frames = 0
+        self.dropped_frames = 0
+
+    def is_playing(self):
+        return self.timer is not None
+
+    def target_fps(self):
+        return self.fps * self.speed
+
+    def rebase(self, frame):
+        # Restart the deadlines from the given frame and now
+        self.start_time = time.monotonic()
+        self.start_frame = frame
+        self.frame = frame
+
+    def start(self, frame):
+        """
+        Start playing from a frame.
+
+        Parameters:
+        - frame: int, the frame on screen
+
+        Returns:
+        None
+        """
+        self.stop()
+        self.rebase(frame)
+        self.play_time = self.start_time
+        self.shown_frames = 0
+        self.dropped_frames = 0
+        self.timer = self.root.after(self.delay_until(self.start_frame + 1), self.tick)
+
+    def stop(self):
+        if self.timer is not None:
+            self.root.after_cancel(self.timer)
+            self.timer = None
+
+    def change_speed(self, steps):
+        """
+        Change the speed multiplier by some steps of SPEEDS.
+
+        Parameters:
+        - steps: int, +1 for faster, -1 for slower
+
+        Returns:
+        - speed: float, the new speed multiplier
+        """
+        index = self.SPEEDS.index(self.speed) + steps
+        self.speed = self.SPEEDS[max(0, min(index, len(self.SPEEDS) - 1))]
+        if self.is_playing():
+            self.rebase(self.frame)
+        return self.speed
+
+    def delay_until(self, frame):
+        # Milliseconds until the deadline of a frame
+        deadline = self.start_time + (frame - self.start_frame) / self.target_fps()
+        return max(1, int((deadline - time.monotonic()) * 1000))
+
+    def tick(self):
+        self.timer = None
+        if self.get_frame() != self.frame:
+            # The user moved to another frame: play on from there
+            self.rebase(self.get_frame())
+            self.timer = self.root.after(self.delay_until(self.frame + 1), self.tick)
+            return
+        if self.frame >= self.last_frame:
+            self.on_finish()
+            return
+
+        elapsed = time.monotonic() - self.start_time
+        due_frame = self.start_frame + int(elapsed * self.target_fps())
+        due_frame = min(due_frame, self.last_frame)
+
+        # Newest decoded frame that is due
+        frame = due_frame
+        while frame > self.frame and not self.is_ready(frame):
+            frame -= 1
+        if frame == self.frame:
+            # Nothing new decoded yet: check again shortly
+            self.timer = self.root.after(self.POLL_INTERVAL, self.tick)
+            return
+
+        self.dropped_frames += frame - self.frame - 1
+        self.shown_frames += 1
+        self.frame = frame
+        self.show(frame)
+
+        if frame >= self.last_frame:
+            self.on_finish()
+            return
+        self.timer = self.root.after(self.delay_until(due_frame + 1), self.tick)
+
+    def stats(self):
+        """
+        Get the statistics of the current (or last) run.
+
+        Parameters:
+        None
+
+        Returns:
+        - stats: dict, achieved and target fps, shown and dropped frames
+        """
+        elapsed = time.monotonic() - self.play_time if self.play_time else 0.0
+        return {
+            "achieved_fps": self.shown_frames / elapsed if elapsed > 0 else 0.0,
+            "target_fps": self.target_fps(),
+            "shown_frames": self.shown_frames,
+            "dropped_frames": self.dropped_frames,
+        }
@@ -0,0 +1,47 @@
+# Two-pass rendering of the image panes:
+# - A quick draft (reduced JPEG decode, BILINEAR resize) is shown at once.
+# - The full-quality pass replaces it once input has been quiet for a
+#   moment; a newer render cancels it, so frames the user has already left
+#   are never finished.
+
+
+class ProgressiveRender:
+    # Quiet time before the full-quality pass, in milliseconds
+    DEFAULT_REFINE_DELAY = 50
+
+    def __init__(self, widget, refine_delay=DEFAULT_REFINE_DELAY):
+        self.widget = widget
+        self.refine_delay = refine_delay
+        self.pending = None
+        # Drafts shown, full-quality passes run and passes cancelled
+        self.drafts = 0
+        self.refines = 0
+        self.cancelled = 0
+
+    def render(self, draft, refine):
+        """
+        Show a draft now and schedule its full-quality replacement.
+
+        Parameters:
+        - draft: callable, renders the quick version
+        - refine: callable, renders the full-quality version
+
+        Returns:
+        None
+        """
+        self.cancel()
+        self.drafts += 1
+        draft()
+        self.pending = self.widget.after(self.refine_delay, self.run_refine, refine)
+
+    def run_refine(self, refine):
+        self.pending = None
+        self.refines += 1
+        refine()
+
+    def cancel(self):
+        # Drop the pending full-quality pass, if there is one
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+            self.pending = None
+            self.cancelled += 1
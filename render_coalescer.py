@@ -0,0 +1,40 @@
+# Coalescing of render requests from bursts of input events:
+# - Slider drags and auto-repeated keys update the application state on
+#   every event, but only ask for a render.
+# - The render runs once, when Tk is idle, for the latest state; requests
+#   made in between are merged into it.
+
+
+class RenderCoalescer:
+    def __init__(self, root, render):
+        self.root = root
+        self.render = render
+        self.pending = None
+        # Requests received and renders run, to see how much was merged
+        self.requests = 0
+        self.renders = 0
+
+    def request(self):
+        """
+        Ask for a render of the latest state at the next idle time.
+
+        Parameters:
+        None
+
+        Returns:
+        None
+        """
+        self.requests += 1
+        if self.pending is None:
+            self.pending = self.root.after_idle(self.run_pending)
+
+    def run_pending(self):
+        self.pending = None
+        self.renders += 1
+        self.render()
+
+    def cancel(self):
+        # Drop the pending render, if there is one
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+            self.pending = None
@@ -0,0 +1,137 @@
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from frame_cache import FrameCache
+from frame_catalog import FrameCatalog
+from parse_cache import DEFAULT_CACHE_DIR
+
+# Pre-downscaled frames for scrubbing the seek bar:
+# - Every frame of an image directory is decoded once, offline, into one
+#   uint8 array of shape (frames + 1, height, width, 3) saved as '.npy'
+#   (row 0 and frames without an image are black).
+# - The video player memory-maps the array and shows its rows while the
+#   slider is dragged, without decoding any JPEG.
+
+
+def scrub_path(directory, size, cache_dir=DEFAULT_CACHE_DIR):
+    path_hash = hashlib.sha1(os.path.abspath(directory).encode()).hexdigest()
+    width, height = size
+    return os.path.join(cache_dir, "scrub", f"{path_hash[:16]}-{width}x{height}.npy")
+
+
+class ScrubFrames:
+    # Default width of the scrub frames (the main view is 1200 px wide)
+    DEFAULT_WIDTH = 480
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    @classmethod
+    def load(cls, directory, size, frame_count, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        Memory-map the scrub frames of a directory, if they have been built.
+
+        Parameters:
+        - directory: str, the image directory
+        - size: tuple, (width, height) of the scrub frames
+        - frame_count: int, number of rows expected (last frame + 1)
+        - cache_dir: str, the cache directory
+
+        Returns:
+        - scrub_frames: ScrubFrames, or None if missing or out of date
+        """
+        path = scrub_path(directory, size, cache_dir)
+        try:
+            frames = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if len(frames) != frame_count:
+            print(f"Ignoring out-of-date scrub frames {path}")
+            return None
+        print(f"Loaded scrub frames {path}")
+        return cls(frames)
+
+    def image(self, frame):
+        """
+        Get a scrub frame.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - img: PIL Image object, RGB image viewing the mapped row
+        """
+        return Image.fromarray(self.frames[frame])
+
+
+def build_scrub_frames(frame_index, path, size, workers=None):
+    """
+    Decode every frame of a directory into a scrub frame array.
+
+    Parameters:
+    - frame_index: FrameIndex or FramePack, the frames to decode
+    - path: str, path of the '.npy' file to write
+    - size: tuple, (width, height) of the scrub frames
+    - workers: int, number of decoding threads (default: CPU count)
+
+    Returns:
+    None
+    """
+    width, height = size
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.npy"
+    frames = np.lib.format.open_memmap(
+        temp_path, mode="w+", dtype=np.uint8, shape=(len(frame_index), height, width, 3)
+    )
+    # Decodes are never kept: the cache is only used for its draft decoding
+    frame_cache = FrameCache(max_bytes=0)
+
+    def decode(frame):
+        source = frame_index[frame]
+        if source is not None:
+            frames[frame] = np.asarray(frame_cache.decode(source, size))
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        list(executor.map(decode, range(1, len(frame_index))))
+    frames.flush()
+    del frames
+    os.replace(temp_path, path)
+
+
+if __name__ == "__main__":
+    # Build the scrub frames of an image directory
+    parser = argparse.ArgumentParser(
+        description="Decode every frame of an image directory for fast scrubbing."
+    )
+    parser.add_argument("directory", help="Image directory (e.g. Config.IMAGE_DIR)")
+    parser.add_argument(
+        "--width",
+        type=int,
+        default=ScrubFrames.DEFAULT_WIDTH,
+        help="Width of the scrub frames",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of decoding threads"
+    )
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    frame_index = FrameCatalog().frames(args.directory)
+    # Keep the aspect ratio of the first frame
+    first_frame = next(f for f in range(1, len(frame_index)) if frame_index[f])
+    first_image = FrameCache(max_bytes=0).decode(frame_index[first_frame])
+    height = round(args.width * first_image.height / first_image.width)
+    size = (args.width, height)
+
+    path = scrub_path(args.directory, size)
+    build_scrub_frames(frame_index, path, size, args.workers)
+    print(
+        f"Built {len(frame_index) - 1} scrub frames of {args.width}x{height} "
+        f"into {path} in {time.perf_counter() - start_time:.1f} s"
+    )
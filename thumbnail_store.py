@@ -0,0 +1,371 @@
+import argparse
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from decode_service import crop_frame
+from frame_cache import FrameCache
+from parse_cache import DEFAULT_CACHE_DIR
+
+# Disk store of the top-10 tiles of the database cows:
+# - A tile is the candidate's box cropped out of its database frame with a
+#   margin, outlined or not, and resized to fit the tile size.
+# - Tiles are saved as JPEG files named after the hash of what they are made
+#   of: database directory (and its modification time), frame, box, tile
+#   size and outline flag. A changed input is a new name, never a stale tile.
+# - The top-10 grid fills the store as it goes; thumbnail_store.py fills it
+#   in bulk from the identification file.
+
+# Margin and outline of the tile crops
+TILE_MARGIN = 10
+TILE_LINE_WIDTH = 3
+TILE_OUTLINE = (255, 0, 0, 170)
+
+
+def fit_image(image, size, resample=Image.LANCZOS):
+    """
+    Resize an image to fit in a size, keeping its aspect ratio.
+
+    Parameters:
+    - image: PIL Image object
+    - size: tuple, (width, height) to fit in
+    - resample: PIL resampling filter
+
+    Returns:
+    - PIL Image object, as wide or as high as size
+    """
+    frame_width, frame_height = size
+    image_aspect_ratio = float(image.width / image.height)
+    if image.width / frame_width > image.height / frame_height:
+        new_width = frame_width
+        new_height = int(frame_width / image_aspect_ratio)
+    else:
+        new_height = frame_height
+        new_width = int(frame_height * image_aspect_ratio)
+    return image.resize((new_width, new_height), resample)
+
+
+def outline_crop(cropped_img, margin=TILE_MARGIN, line_width=TILE_LINE_WIDTH):
+    # Outline the box inside its margin, in place
+    draw = ImageDraw.Draw(cropped_img, "RGBA")
+    draw.rectangle(
+        [(margin, margin), (cropped_img.width - margin, cropped_img.height - margin)],
+        outline=TILE_OUTLINE,
+        width=line_width,
+    )
+
+
+def tile_crop_box(box):
+    """
+    Get the region of a database frame cropped for a tile.
+
+    Parameters:
+    - box: tuple, (x, y, w, h) of the cow in the frame
+
+    Returns:
+    - crop_box: tuple, (x1, y1, x2, y2), the box with its margin (to be
+      clipped to the frame)
+    """
+    x, y, w, h = box
+    return (x - TILE_MARGIN, y - TILE_MARGIN, x + w + TILE_MARGIN, y + h + TILE_MARGIN)
+
+
+def finish_tile(cropped_img, size, overlay):
+    """
+    Turn the crop of a database cow into its tile.
+
+    Every tile, made by the grid or by build_thumbnails, goes through here.
+
+    Parameters:
+    - cropped_img: PIL Image object, the tile_crop_box region of the frame
+      (outlined in place if overlay is True)
+    - size: tuple, (width, height) of the tile
+    - overlay: bool, True to outline the box
+
+    Returns:
+    - tile: PIL Image object, fitted to size
+    """
+    if overlay:
+        outline_crop(cropped_img)
+    return fit_image(cropped_img, size)
+
+
+def make_tile(frame_img, box, size, overlay):
+    """
+    Make the tile of a database cow.
+
+    Parameters:
+    - frame_img: PIL Image object, the database frame
+    - box: tuple, (x, y, w, h) of the cow in the frame
+    - size: tuple, (width, height) of the tile
+    - overlay: bool, True to outline the box
+
+    Returns:
+    - tile: PIL Image object, fitted to size
+    """
+    return finish_tile(crop_frame(frame_img, tile_crop_box(box)), size, overlay)
+
+
+class ThumbnailStore:
+    # Bump when the tiles are made differently (see finish_tile)
+    FORMAT_VERSION = 1
+    QUALITY = 95
+    # Disk budget of the store (bytes); the least recently used tiles go first
+    DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+    def __init__(
+        self, image_dir, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES
+    ):
+        self.directory = os.path.join(cache_dir, "thumbs")
+        self.max_bytes = max_bytes
+        # Tiles of another directory, or of this one before it changed, get
+        # other names
+        self.source = f"{os.path.abspath(image_dir)}@{os.stat(image_dir).st_mtime_ns}"
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, frame, box, size, overlay):
+        """
+        Get the path of a tile.
+
+        Parameters:
+        - frame: int, the database frame number
+        - box: tuple, (x, y, w, h) of the cow in the frame
+        - size: tuple, (width, height) of the tile
+        - overlay: bool, True if the box is outlined
+
+        Returns:
+        - path: str, path to the JPEG file of the tile
+        """
+        key = "|".join(
+            str(part)
+            for part in (
+                self.FORMAT_VERSION,
+                self.source,
+                int(frame),
+                tuple(int(value) for value in box),
+                tuple(size),
+                bool(overlay),
+            )
+        )
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.jpg")
+
+    def get(self, frame, box, size, overlay):
+        """
+        Read a tile from the store.
+
+        Parameters:
+        - frame, box, size, overlay: see path
+
+        Returns:
+        - tile: PIL Image object, or None if it is not stored yet
+        """
+        path = self.path(frame, box, size, overlay)
+        try:
+            with Image.open(path) as file:
+                tile = file.convert("RGB")
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            # Used now: trim() keeps it over the tiles not used since
+            os.utime(path)
+        except OSError:
+            pass
+        return tile
+
+    def put(self, frame, box, size, overlay, tile):
+        """
+        Save a tile to the store.
+
+        Parameters:
+        - frame, box, size, overlay: see path
+        - tile: PIL Image object, the tile
+
+        Returns:
+        None
+        """
+        path = self.path(frame, box, size, overlay)
+        # Tiles are saved from several threads, and processes
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.jpg"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tile.save(temp_path, "JPEG", quality=self.QUALITY)
+            os.replace(temp_path, path)
+        except OSError as error:
+            # The store is only an accelerator; keep going without it
+            print(f"Could not save the tile {path}: {error}")
+
+    def trim(self):
+        """
+        Delete the least recently used tiles until the store fits its budget.
+
+        Tiles of directories that changed are never used again, so they go
+        first.
+
+        Parameters:
+        None
+
+        Returns:
+        - deleted: int, number of tiles deleted
+        """
+        tiles = []  # (mtime, bytes, path)
+        try:
+            subdirectories = list(os.scandir(self.directory))
+        except OSError:
+            return 0
+        for subdirectory in subdirectories:
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                tiles.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in tiles)
+        deleted = 0
+        for _, size, path in sorted(tiles):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+            deleted += 1
+        return deleted
+
+
+def build_thumbnails(thumbnail_store, frame_index, tiles, size, overlays, workers=None):
+    """
+    Make and store the tiles of many database cows.
+
+    Each database frame is decoded once, for all of its tiles.
+
+    Parameters:
+    - thumbnail_store: ThumbnailStore, the store to fill
+    - frame_index: FrameIndex or FramePack, the database frames
+    - tiles: np.ndarray, unique rows of (frame, x, y, w, h)
+    - size: tuple, (width, height) of the tiles
+    - overlays: list, outline flags to make the tiles for
+    - workers: int, number of decoding threads (default: CPU count)
+
+    Returns:
+    - tile_count: int, number of tiles made (tiles already stored are skipped)
+    """
+    boxes_per_frame = {}  # frame -> list of (x, y, w, h)
+    for frame, x, y, w, h in tiles.tolist():
+        if frame in frame_index:
+            boxes_per_frame.setdefault(frame, []).append((x, y, w, h))
+    # Decodes are never kept: the cache is only used for its decoding
+    frame_cache = FrameCache(max_bytes=0)
+
+    def make_frame_tiles(frame):
+        missing = [
+            (box, overlay)
+            for box in boxes_per_frame[frame]
+            for overlay in overlays
+            if not os.path.exists(thumbnail_store.path(frame, box, size, overlay))
+        ]
+        if missing:
+            frame_img = frame_cache.decode(frame_index[frame])
+            for box, overlay in missing:
+                tile = make_tile(frame_img, box, size, overlay)
+                thumbnail_store.put(frame, box, size, overlay, tile)
+        return len(missing)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return sum(executor.map(make_frame_tiles, sorted(boxes_per_frame)))
+
+
+if __name__ == "__main__":
+    from annotations_loader import AnnotationsLoader
+    from candidate_list import CandidateList
+    from frame_catalog import FrameCatalog
+    from parse_cache import ParseCache
+
+    # Fill the tile store with the candidates of an identification file
+    parser = argparse.ArgumentParser(
+        description="Make the top-10 tiles of the candidates of an identification file."
+    )
+    parser.add_argument(
+        "identification_file",
+        help="Identification file (e.g. Config.IDENTIFICATION_FILE)",
+    )
+    parser.add_argument(
+        "database_image_dir",
+        help="Database image directory (e.g. Config.DATABASE_IMAGE_DIR)",
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        nargs=2,
+        default=(200, 200),
+        help="Tile width and height (Config.TOP10_FRAME_WIDTH and HEIGHT)",
+    )
+    parser.add_argument(
+        "--max_rank",
+        type=int,
+        default=CandidateList.DEFAULT_TOP_K,
+        help="Only make the tiles of the first candidates of each query (Config.TOP_K)",
+    )
+    parser.add_argument(
+        "--excluded_ids",
+        type=int,
+        nargs="*",
+        default=[],
+        help="Database cow IDs left out of the ranks, as the grid leaves out "
+        "confirmed IDs",
+    )
+    parser.add_argument(
+        "--overlay",
+        choices=("on", "off", "both"),
+        default="on",
+        help="Make the tiles with the box outlined, without, or both",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of decoding threads"
+    )
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    identification_store = AnnotationsLoader(
+        ParseCache()
+    ).load_individual_identification_annotations(args.identification_file)
+    rows = identification_store.rows
+    # Rank of each row within its query once the excluded IDs are left out,
+    # as CandidateList.query ranks them; the candidates are in rank order
+    query_offsets = identification_store.query_offsets
+    kept = ~np.isin(rows["cow_id"], args.excluded_ids)
+    kept_before = np.concatenate(([0], np.cumsum(kept)))
+    ranks = kept_before[1:] - 1 - np.repeat(
+        kept_before[query_offsets[:-1]], np.diff(query_offsets)
+    )
+    rows = rows[kept & (ranks < args.max_rank)]
+    tiles = np.unique(
+        np.stack(
+            [rows[name] for name in ("top_10_frame", "x", "y", "w", "h")], axis=1
+        ),
+        axis=0,
+    )
+    overlays = {"on": [True], "off": [False], "both": [True, False]}[args.overlay]
+
+    thumbnail_store = ThumbnailStore(args.database_image_dir)
+    frame_index = FrameCatalog().frames(args.database_image_dir)
+    tile_count = build_thumbnails(
+        thumbnail_store, frame_index, tiles, tuple(args.size), overlays, args.workers
+    )
+    deleted = thumbnail_store.trim()
+    print(
+        f"Made {tile_count} tiles for {len(tiles)} candidates into "
+        f"{thumbnail_store.directory} in {time.perf_counter() - start_time:.1f} s "
+        f"({deleted} old tiles deleted)"
+    )
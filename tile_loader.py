@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Background filling of the top-10 grid:
+# - The tiles of a page are made by a thread pool, submitted in rank order so
+#   that rank 1 is made first.
+# - Finished tiles are picked up on the Tk thread by a short after() poll and
+#   shown as soon as each one is ready; the grid shows placeholders meanwhile.
+# - Loading another page (or cancelling) drops the tiles of the previous one:
+#   those not started are cancelled, the others are discarded when done.
+
+
+class TileLoader:
+    DEFAULT_WORKERS = 4
+    # Interval between checks for finished tiles, in milliseconds
+    DEFAULT_POLL_INTERVAL = 10
+
+    def __init__(
+        self, widget, workers=DEFAULT_WORKERS, poll_interval=DEFAULT_POLL_INTERVAL
+    ):
+        self.widget = widget
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="tile-loader"
+        )
+        self.pending = []  # (key, Future of the tile) of the current load
+        self.on_tile = None
+        self.poll_id = None
+        # Tiles shown, and tiles made for a page that had already changed
+        self.shown = 0
+        self.discarded = 0
+
+    def load(self, jobs, on_tile):
+        """
+        Make tiles in the background and show each one when it is ready.
+
+        Parameters:
+        - jobs: list, (key, make) pairs in rank order, where make() returns
+          the tile and runs on a worker thread
+        - on_tile: callable, on_tile(key, tile), called on the Tk thread, with
+          a tile of None if make() failed
+
+        Returns:
+        None
+        """
+        self.cancel()
+        self.on_tile = on_tile
+        self.pending = [(key, self.executor.submit(make)) for key, make in jobs]
+        if self.pending:
+            self.poll_id = self.widget.after(self.poll_interval, self.poll)
+
+    def poll(self):
+        self.poll_id = None
+        done = []
+        pending = []
+        for key, future in self.pending:
+            # Checked once: a tile finishing meanwhile is picked up next time
+            (done if future.done() else pending).append((key, future))
+        self.pending = pending
+        if self.pending:
+            self.poll_id = self.widget.after(self.poll_interval, self.poll)
+        for key, future in done:
+            try:
+                tile = future.result()
+            except Exception as error:
+                # One unreadable frame must not hold up the rest of the page
+                print(f"Could not make the tile {key}: {error!r}")
+                tile = None
+            self.shown += 1
+            self.on_tile(key, tile)
+
+    def cancel(self):
+        # Drop the tiles of the current load, if any are still being made
+        if self.poll_id is not None:
+            self.widget.after_cancel(self.poll_id)
+            self.poll_id = None
+        for _, future in self.pending:
+            if not future.cancel():
+                self.discarded += 1
+        self.pending = []
+
+    def close(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,135 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from frame_cache import FrameCache
+
+# Speculative making of the top-10 tiles the annotator is likely to see next:
+# - When a query cow is selected, the tiles of its other pages and of its
+#   candidate lists in the neighbouring frames are made in the background,
+#   so that flipping pages or stepping frames finds them ready.
+# - Tiles are kept in memory in an LRU bounded in bytes; a prefetch round
+#   stops once it has used half of the budget, so it never evicts the tiles
+#   on screen or the ones it has just made.
+# - A new round supersedes the previous one: it stops after its current tile.
+# - Hits and misses count how often a tile to show had already been made.
+
+
+class TilePrefetcher:
+    # Memory budget of the tiles kept in memory (bytes)
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+    # Number of identification frames prefetched on each side of the current one
+    DEFAULT_NEIGHBOUR_FRAMES = 1
+
+    def __init__(
+        self,
+        max_bytes=DEFAULT_MAX_BYTES,
+        neighbour_frames=DEFAULT_NEIGHBOUR_FRAMES,
+    ):
+        self.tiles = FrameCache(max_bytes=max_bytes)
+        self.neighbour_frames = neighbour_frames
+        # One thread, so that prefetching never holds up the tiles on screen
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="tile-prefetch"
+        )
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+
+    def lookup(self, key):
+        """
+        Get a tile to show, if it has already been made.
+
+        Parameters:
+        - key: tuple, the tile key (see TopkViewWindow.tile_key)
+
+        Returns:
+        - tile: PIL Image object, or None (counted as a miss)
+        """
+        tile = self.tiles.lookup(key)
+        with self.lock:
+            if tile is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return tile
+
+    def put(self, key, tile):
+        self.tiles.put(key, tile)
+
+    def prefetch(self, plan):
+        """
+        Start a prefetch round, superseding the previous one.
+
+        Parameters:
+        - plan: callable, returns the (key, make) pairs of the tiles to make,
+          most likely first; runs on the prefetch thread, as does make(),
+          which must not put the tile itself
+
+        Returns:
+        None
+        """
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        self.executor.submit(self.run, generation, plan)
+
+    def superseded(self, generation):
+        with self.lock:
+            return generation != self.generation
+
+    def run(self, generation, plan):
+        if self.superseded(generation):
+            return
+        budget = self.tiles.max_bytes // 2
+        for key, make in plan():
+            if self.superseded(generation):
+                return
+            if self.tiles.lookup(key) is not None:
+                continue
+            try:
+                tile = make()
+            except Exception as error:
+                # An unreadable frame only loses its own tile
+                print(f"Could not prefetch the tile {key}: {error!r}")
+                continue
+            # Checked before the tile is kept, so the round never goes over
+            budget -= FrameCache.image_bytes(tile)
+            if budget < 0:
+                return
+            self.tiles.put(key, tile)
+            with self.lock:
+                self.prefetched += 1
+
+    def cancel(self):
+        # Stop the current round after its current tile
+        with self.lock:
+            self.generation += 1
+
+    def stats(self):
+        """
+        Get the prefetch counters.
+
+        Parameters:
+        None
+
+        Returns:
+        - stats: dict, hits, misses and hit rate of lookup(), tiles
+          prefetched, and tiles and bytes in memory
+        """
+        tile_stats = self.tiles.stats()
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "prefetched": self.prefetched,
+                "entries": tile_stats["entries"],
+                "bytes": tile_stats["bytes"],
+            }
+
+    def close(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,9 +1,16 @@
-import os
 import tkinter as tk
 import tkinter.font as tkFont
-from PIL import Image, ImageTk, ImageDraw
+from PIL import Image, ImageTk
 from PIL.Image import Resampling
 import numpy as np
+from functools import partial
+
+from candidate_list import EMPTY_CROP_ROW, CandidateList
+from decode_service import crop_frames
+from photo_pool import PhotoImagePool
+from thumbnail_store import finish_tile, fit_image, outline_crop, tile_crop_box
+from tile_loader import TileLoader
+from tile_prefetcher import TilePrefetcher
 
 
 class TopkViewWindow:
@@ -18,6 +25,10 @@ class TopkViewWindow:
         app_state,
         time_tracker,
         hide_bounding_box,
+        frame_cache,
+        frame_catalog,
+        decode_service=None,
+        thumbnail_store=None,
     ):
         # Local imports
         self.config = config
@@ -30,18 +41,48 @@ class TopkViewWindow:
         self.show_all_windows = show_all_windows
         self.finish_evaluation = finish_evaluation
         self.cow_labels = {}
-        self.top_10_matched_cows_info = {}
+        # Ranked candidates of the selected cow, K of them over the pages
+        self.candidate_list = CandidateList(
+            individual_identification_annotations,
+            getattr(config, "TOP_K", CandidateList.DEFAULT_TOP_K),
+            getattr(config, "TOP10_PAGE_SIZE", CandidateList.DEFAULT_PAGE_SIZE),
+        )
+        self.top10_matched_cows_each_image_number = np.zeros(
+            (self.candidate_list.page_size + 1, 1)
+        )
         self.grid_frame_topk = None  # Initialize this with your grid frame
         self.selected_topk_cow = None
 
         self.app_state = app_state
         self.time_tracker = time_tracker
+        self.frame_cache = frame_cache
+        self.frame_catalog = frame_catalog
+        self.decode_service = decode_service
+        self.thumbnail_store = thumbnail_store
+        # Tiles made in the background and shown as each one is ready
+        self.tile_loader = TileLoader(
+            right_canvas,
+            getattr(self.config, "TOP10_TILE_WORKERS", TileLoader.DEFAULT_WORKERS),
+        )
+        # Tiles of the other pages and neighbouring frames, made ahead
+        self.tile_prefetcher = TilePrefetcher(
+            getattr(
+                self.config, "TOP10_PREFETCH_BYTES", TilePrefetcher.DEFAULT_MAX_BYTES
+            ),
+            getattr(
+                self.config,
+                "TOP10_PREFETCH_FRAMES",
+                TilePrefetcher.DEFAULT_NEIGHBOUR_FRAMES,
+            ),
+        )
+        # One PhotoImage per top-10 tile, updated in place
+        self.photo_pool = PhotoImagePool()
 
         self.setup_top_k_window(self.config.DATABASE_IMAGE_DIR, right_canvas)
 
     def setup_top_k_window(self, database_image_dir, right_canvas):
         ###Top-k Display Window (Right)###
-        self.database_image_files = self.get_sorted_image_files(database_image_dir)
+        self.database_image_files = self.frame_catalog.frames(database_image_dir)
 
         self.canvas = tk.Canvas(right_canvas)
         self.canvas.pack()
@@ -118,7 +159,9 @@ class TopkViewWindow:
             text="Hide Bounding Box",
             command=self.hide_bounding_box,
         )
-        hide_bounding_box_button.grid(row=7, column=1, ipadx=10, ipady=10)
+        # Below the grid rows of the cows, two to a row from row 1
+        buttons_row = (self.candidate_list.page_size + 1) // 2 + 2
+        hide_bounding_box_button.grid(row=buttons_row, column=1, ipadx=10, ipady=10)
 
         # Manual input cow ID
         self.input_value = tk.StringVar()
@@ -127,7 +170,7 @@ class TopkViewWindow:
         manual_input_label = tk.Label(
             self.grid_frame_topk, text="Manual Input Cow #", font=customFont
         )
-        manual_input_label.grid(row=8, column=0)
+        manual_input_label.grid(row=buttons_row + 1, column=0)
 
         id_input_field = tk.Entry(
             self.grid_frame_topk,
@@ -138,7 +181,7 @@ class TopkViewWindow:
             highlightcolor="#FFFFFF",
             width=2,
         )
-        id_input_field.grid(row=8, column=1, ipadx=10, ipady=10)
+        id_input_field.grid(row=buttons_row + 1, column=1, ipadx=10, ipady=10)
 
         self.cow_labels = {}  # To store Label and PhotoImage objects for each cow
 
@@ -146,76 +189,155 @@ class TopkViewWindow:
             self.initialize_top10_image()
 
     ###top-k window###
-    def draw_rectangle_crop_image(
-        self, draw, x1, y1, x2, y2, r, g, b, line_opacity=255, line_width=8
-    ):
+    def crop_image(self, frame_number, tool_number, x=None, y=None, w=None, h=None):
         """
-        Draw a rectangle on the canvas.
+        Crop the image around the selected cow based on its bounding box.
 
         Parameters:
-        None
+        - frame_number: int, the frame number for which to crop the image
+        - tool_number: int, the tool number (0:selected_cow, 1:multi_view_window)
 
         Returns:
+        - cropped_img: PIL Image object, cropped image
+        """
+        return self.crop_images([(frame_number, x, y, w, h)], tool_number)[0]
+
+    def crop_images(self, rows, tool_number=2, overlay=None):
+        """
+        Crop the database images of several matched cows at once.
+
+        With a decode service, the database frames are decoded in parallel
+        by its worker processes instead of one after the other.
+
+        Parameters:
+        - rows: list, (frame_number, x, y, w, h) of each matched cow
+        - tool_number: int, the tool number (2:top-k window)
+        - overlay: bool, True to outline the boxes (default: the current
+          bounding box display)
+
+        Returns:
+        - cropped_imgs: list, PIL Image objects in the order of the rows
+        """
+        if overlay is None:
+            overlay = self.app_state.display_bounding_boxes
+
+        # Add a margin; crop_frames keeps the boxes inside the images
+        jobs = [
+            (self.database_image_files[frame_number], tile_crop_box((x, y, w, h)))
+            for frame_number, x, y, w, h in rows
+        ]
+        cropped_imgs = crop_frames(jobs, self.frame_cache, self.decode_service)
+
+        for i, cropped_img in enumerate(cropped_imgs):
+            if cropped_img is None:
+                # No database image for this frame
+                cropped_imgs[i] = Image.open(self.config.SELECTED_COW_NO_PHOTO)
+                continue
+
+            # Draw the bounding box on the cropped image in red
+            if tool_number == 0 or overlay:
+                outline_crop(cropped_img)
+
+        return cropped_imgs
+
+    def tile_spec(self):
+        """
+        Get the current tile size and overlay flag.
+
+        Read on the Tk thread and passed to the tile threads, so that a tile
+        is made and stored for one overlay even if it is toggled meanwhile.
+
+        Parameters:
         None
+
+        Returns:
+        - size: tuple, (width, height) of the tiles
+        - overlay: bool, True if the boxes are outlined
         """
-        draw.rectangle(
-            [(int(x1), int(y1)), (int(x2), int(y2))],
-            outline=(r, g, b, line_opacity),
-            width=line_width,
-        )
+        size = (self.config.TOP10_FRAME_WIDTH, self.config.TOP10_FRAME_HEIGHT)
+        return size, bool(self.app_state.display_bounding_boxes)
 
-    def crop_image(self, frame_number, tool_number, x=None, y=None, w=None, h=None):
+    def tile_key(self, row, size, overlay):
+        # What a tile is made of, as in the thumbnail store
+        return (tuple(row), size, overlay)
+
+    def cached_tile(self, row, size, overlay):
         """
-        Crop the image around the selected cow based on its bounding box.
+        Get the top-10 tile of a matched cow, if it does not have to be made.
 
         Parameters:
-        - frame_number: int, the frame number for which to crop the image
-        - tool_number: int, the tool number (0:selected_cow, 1:multi_view_window)
+        - row: tuple, (frame_number, x, y, w, h) of the matched cow
+        - size, overlay: see tile_spec
 
         Returns:
-        - cropped_img: PIL Image object, cropped image
+        - tile: PIL Image object from memory or the thumbnail store, or None
         """
-        if tool_number == 2:
-            boundaries = 10
-            line_width = 3
-            x1 = x
-            y1 = y
-            x2 = x + w
-            y2 = y + h
-            img_path = self.database_image_files[frame_number]
-
-        img = Image.open(img_path)
-        img_width, img_height = img.size
-
-        # Add a margin, checking that we don't go out of image boundaries
-        x1 = max(0, x1 - boundaries)
-        y1 = max(0, y1 - boundaries)
-        x2 = min(img_width, x2 + boundaries)
-        y2 = min(img_height, y2 + boundaries)
-
-        # Crop the image
-        cropped_img = img.crop((x1, y1, x2, y2))
-
-        # Draw the bounding box on the cropped image in red
-        draw = ImageDraw.Draw(cropped_img, "RGBA")
-        if tool_number == 0 or self.app_state.display_bounding_boxes:
-            self.draw_rectangle_crop_image(
-                draw,
-                boundaries,
-                boundaries,
-                x2 - x1 - boundaries,
-                y2 - y1 - boundaries,
-                255,
-                0,
-                0,
-                170,
-                line_width,
-            )
+        key = self.tile_key(row, size, overlay)
+        tile = self.tile_prefetcher.lookup(key)
+        if tile is None:
+            tile = self.stored_tile(row, size, overlay)
+            if tile is not None:
+                self.tile_prefetcher.put(key, tile)
+        return tile
+
+    def load_tile(self, row, size, overlay):
+        # Tile of a matched cow from the thumbnail store, or made
+        tile = self.stored_tile(row, size, overlay)
+        if tile is None:
+            tile = self.make_tile(row, size, overlay)
+        return tile
+
+    def stored_tile(self, row, size, overlay):
+        """
+        Read the top-10 tile of a matched cow from the thumbnail store.
 
-        return cropped_img
+        Parameters:
+        - row: tuple, (frame_number, x, y, w, h) of the matched cow
+        - size, overlay: see tile_spec
+
+        Returns:
+        - tile: PIL Image object, or None if it has to be made
+        """
+        # Frames without a database image show the no-photo image, not stored
+        if (
+            self.thumbnail_store is None
+            or self.database_image_files[row[0]] is None
+        ):
+            return None
+        return self.thumbnail_store.get(row[0], row[1:], size, overlay)
+
+    def make_tile(self, row, size, overlay):
+        """
+        Crop the top-10 tile of a matched cow, fitted to the tile size.
+
+        Runs on the tile loader and prefetch threads; the tile is saved to
+        the thumbnail store, and kept in memory by the caller.
+
+        Parameters:
+        - row: tuple, (frame_number, x, y, w, h) of the matched cow
+        - size, overlay: see tile_spec
+
+        Returns:
+        - tile: PIL Image object
+        """
+        cropped_img = self.crop_images([row], overlay=False)[0]
+        if self.database_image_files[row[0]] is None:
+            # The no-photo image: neither outlined nor stored
+            return fit_image(cropped_img, size)
+        # Made like the tiles of build_thumbnails, which the store also serves
+        tile = finish_tile(cropped_img, size, overlay)
+        if self.thumbnail_store is not None:
+            self.thumbnail_store.put(row[0], row[1:], size, overlay, tile)
+        return tile
 
     def resize_and_center(
-        self, image, frame_width, frame_height, background_color="#ECD9D9"
+        self,
+        image,
+        frame_width,
+        frame_height,
+        background_color="#ECD9D9",
+        resample=Resampling.LANCZOS,
+        slot=None,
     ):
         """
         Resize and center the image within the given frame dimensions.
@@ -225,38 +347,55 @@ class TopkViewWindow:
         - frame_width: int, the width of the frame
         - frame_height: int, the height of the frame
         - background_color: str, the background color
+        - resample: PIL resampling filter (BILINEAR for quick previews)
+        - slot: hashable, the label slot whose PhotoImage is updated in place,
+          or None for a new PhotoImage
 
         Returns:
-        - PIL Image object, resized and centered
+        - ImageTk.PhotoImage object, resized and centered
         """
-        image_aspect_ratio = float(image.width / image.height)
-        if image.width / frame_width > image.height / frame_height:
-            new_width = frame_width
-            new_height = int(frame_width / image_aspect_ratio)
+        new_image = fit_image(image, (frame_width, frame_height), resample)
+        return self.center_image(
+            new_image, frame_width, frame_height, background_color, slot
+        )
+
+    def center_image(
+        self,
+        image,
+        frame_width,
+        frame_height,
+        background_color="#ECD9D9",
+        slot=None,
+    ):
+        """
+        Center an image that already fits within the given frame dimensions.
+
+        Parameters:
+        - image: PIL Image object, at most frame_width x frame_height
+        - frame_width: int, the width of the frame
+        - frame_height: int, the height of the frame
+        - background_color: str, the background color
+        - slot: hashable, the label slot whose PhotoImage is updated in place,
+          or None for a new PhotoImage
+
+        Returns:
+        - ImageTk.PhotoImage object, centered
+        """
+        if slot is None:
+            background = Image.new(
+                "RGB", (frame_width, frame_height), background_color
+            )
         else:
-            new_height = frame_height
-            new_width = int(frame_height * image_aspect_ratio)
-        new_image = image.resize((new_width, new_height), Resampling.LANCZOS)
-
-        background = Image.new("RGB", (frame_width, frame_height), background_color)
-
-        paste_x = (frame_width - new_width) // 2
-        paste_y = (frame_height - new_height) // 2
-        background.paste(new_image, (paste_x, paste_y))
-        return ImageTk.PhotoImage(background)
-
-    def get_sorted_image_files(self, directory):
-        # Get a list of all image files in the directory
-        image_files = [
-            os.path.join(directory, f)
-            for f in os.listdir(directory)
-            if f.endswith(".jpg")
-        ]
-        # Sort the images by filename
-        image_files = sorted(image_files)
-        # Insert a dummy element at the beginning to make the index start from 1
-        image_files.insert(0, None)
-        return image_files
+            background = self.photo_pool.background(
+                slot, (frame_width, frame_height), background_color
+            )
+
+        paste_x = (frame_width - image.width) // 2
+        paste_y = (frame_height - image.height) // 2
+        background.paste(image, (paste_x, paste_y))
+        if slot is None:
+            return ImageTk.PhotoImage(background)
+        return self.photo_pool.photo(slot, background)
 
     def on_frame_configure(self, event):
         self.canvas.configure(scrollregion=self.canvas.bbox("all"))
@@ -272,7 +411,7 @@ class TopkViewWindow:
         Returns:
         None
         """
-        for i in range(1, 11):
+        for i in range(1, self.candidate_list.page_size + 1):
             row = (i - 1) // 2 + 1  # Calculate grid row, starting from 1
             col = (i - 1) % 2  # Calculate grid column
             image_path = f"{self.config.TOP10_IMAGE_DIR_DEFAULT}/cow_1.jpg"
@@ -280,7 +419,10 @@ class TopkViewWindow:
             # Open and resize the image
             image = Image.open(image_path)
             photo = self.resize_and_center(
-                image, self.config.TOP10_FRAME_WIDTH, self.config.TOP10_FRAME_HEIGHT
+                image,
+                self.config.TOP10_FRAME_WIDTH,
+                self.config.TOP10_FRAME_HEIGHT,
+                slot=i,
             )
             # Create a label with the image and the cow's score
             topk_label = tk.Label(
@@ -363,7 +505,9 @@ class TopkViewWindow:
             # click event
             self.selected_topk_cow_rank = top10_rank
             top_10_cows_image_page = self.app_state.get_top_10_cows_image_page()
-            cow_rank = top10_rank + 10 * (top_10_cows_image_page - 1)
+            cow_rank = top10_rank + self.candidate_list.page_size * (
+                top_10_cows_image_page - 1
+            )
             (
                 self.selected_topk_cow,
                 dummy,
@@ -372,7 +516,7 @@ class TopkViewWindow:
                 dummy,
                 dummy,
                 dummy,
-            ) = self.top_10_matched_cows_info[cow_rank]
+            ) = self.candidate_list.rank(cow_rank)
 
             self.selected_topk_cow = int(self.selected_topk_cow)
             self.time_tracker.record_button_press(
@@ -384,151 +528,260 @@ class TopkViewWindow:
                 text=f"{1}/{int(self.top10_matched_cows_each_image_number[top10_rank])}"
             )
 
-            self.show_top_10_cows()
+            # Redraw the page with the clicked cow highlighted
+            self.show_top_10_cows(highlighted_rank=top10_rank)
 
-            # Crop and resize image
-            cow_id, distance, frame_number, x, y, w, h = self.top_10_matched_cows_info[
+            cow_id, distance, frame_number, x, y, w, h = self.candidate_list.rank(
                 cow_rank
-            ]
-
-            print(cow_id, distance, frame_number, x, y, w, h)
-            new_image = self.crop_image(
-                int(frame_number), 2, int(x), int(y), int(w), int(h)
-            )
-            new_photo = self.resize_and_center(
-                new_image,
-                self.config.TOP10_FRAME_WIDTH,
-                self.config.TOP10_FRAME_HEIGHT,
-                "#008000",
-            )
-            cow_rank = top10_rank + 10 * (top_10_cows_image_page - 1)
-            self.Update_the_label_and_photo_for_top10_image(
-                top10_rank,
-                new_photo,
-                int(cow_id),
-                float(distance),
-                "#008000",
-                "flat",
-                cow_rank,
             )
+            print(cow_id, distance, frame_number, x, y, w, h)
         else:
             self.time_tracker.record_button_press(
                 "Without selecting cow ID, clicked on database cow #", top10_rank
             )
 
     def find_top10_cows(self):
-        Top_10_grid_rank = 1
         current_image_frame = self.app_state.get_current_image_frame()
         target_frame = int(current_image_frame)
         selected_cow = self.app_state.get_selected_cow()
         target_cow_tag = int(selected_cow)
-        (
-            selected_x,
-            selected_y,
-            selected_w,
-            selected_h,
-        ) = self.app_state.get_selected_cow_annotation()
-        if target_frame in self.individual_identification_annotations:
-            # Initialize the bounding_boxes list for this frame
-            for annotation in self.individual_identification_annotations[target_frame]:
-                (
-                    cow_tag,
-                    query_x,
-                    query_y,
-                    query_w,
-                    query_h,
-                    cow_id,
-                    distance,
-                    top_10_frame,
-                    x,
-                    y,
-                    w,
-                    h,
-                ) = annotation
-
-                if (
-                    cow_tag == target_cow_tag
-                    and selected_x == query_x
-                    and selected_y == query_y
-                    and selected_w == query_w
-                    and selected_h == query_h
-                ):
-                    cow_id = int(cow_id)
-                    distance = float(distance)
-                    distance = round(distance, 2)
-                    # Check if the id matches any saved cows
-                    saved_cows = self.app_state.get_saved_cows()
-                    matching_rows = [row for row in saved_cows if row[1] == cow_id]
-                    if len(matching_rows) == 0:
-                        self.top_10_matched_cows_info[Top_10_grid_rank] = [
-                            int(cow_id),
-                            float(distance),
-                            int(top_10_frame),
-                            int(x),
-                            int(y),
-                            int(w),
-                            int(h),
-                        ]
-                        Top_10_grid_rank += 1
-
-    def show_top_10_cows(self):
-        self.top_10_matched_cows_before_crop_image = {}
-        self.top_10_matched_cows_info = np.zeros(
-            (100, 7)
-        )  # cow_id, distance, frame_number, x, y, w, h
-        self.top10_matched_cows_each_image_number = np.zeros((11, 1))
-        top_10_cows_image_page = self.app_state.get_top_10_cows_image_page()
-        self.top10_cow_number_photo.config(text=f"{top_10_cows_image_page}/3")
+        selected_annotation = self.app_state.get_selected_cow_annotation()
+
+        # Leave out the database cows whose ID has already been confirmed
+        saved_cows = self.app_state.get_saved_cows()
+        confirmed_ids = [row[1] for row in saved_cows]
+        # Reused as it is when the same query is shown again
+        self.candidate_list.select(
+            target_frame, target_cow_tag, selected_annotation, confirmed_ids
+        )
 
+    def show_top_10_cows(self, highlighted_rank=None):
+        self.top_10_matched_cows_before_crop_image = {}
         selected_cow = self.app_state.get_selected_cow()
         if selected_cow and self.app_state.get_selected_cow_exist():
-            # Find the top 10 matched cows
+            # Find the top K matched cows
             self.find_top10_cows()
         else:
+            self.candidate_list.clear()
             self.text_selected_cow.config(text=f"Cow #0")
 
-        for Top_10_grid_rank in range(1, 11):
-            cow_rank = Top_10_grid_rank + 10 * (top_10_cows_image_page - 1)
-            cow_id, distance, frame_number, x, y, w, h = self.top_10_matched_cows_info[
-                cow_rank
-            ]
-            if selected_cow and self.app_state.get_selected_cow_exist():
-                # Crop and resize image
-                new_image = self.crop_image(
-                    int(frame_number), 2, int(x), int(y), int(w), int(h)
+        top_10_cows_image_page = self.app_state.get_top_10_cows_image_page()
+        self.top10_cow_number_photo.config(
+            text=f"{top_10_cows_image_page}/{self.candidate_list.page_count}"
+        )
+
+        if selected_cow and self.app_state.get_selected_cow_exist():
+            self.show_top10_page(top_10_cows_image_page, highlighted_rank)
+            self.prefetch_tiles(top_10_cows_image_page)
+            return
+
+        self.tile_loader.cancel()
+        self.tile_prefetcher.cancel()
+        for Top_10_grid_rank in range(1, self.candidate_list.page_size + 1):
+            self.show_default_tile(Top_10_grid_rank)
+
+    def show_default_tile(self, Top_10_grid_rank):
+        # Show Default image
+        image_path = f"{self.config.TOP10_IMAGE_DIR_DEFAULT}/cow_0.jpg"
+
+        # Open and resize the image
+        image = Image.open(image_path)
+        new_photo = self.resize_and_center(
+            image,
+            self.config.TOP10_FRAME_WIDTH,
+            self.config.TOP10_FRAME_HEIGHT,
+            slot=Top_10_grid_rank,
+        )
+        self.Update_the_label_and_photo_for_top10_image(Top_10_grid_rank, new_photo)
+
+    def show_top10_page(self, page, highlighted_rank=None, default_empty=False):
+        """
+        Show the matched cows of a page of the top-10 grid.
+
+        Stored tiles are shown at once; the others are blank until the tile
+        loader has made them, in rank order.
+
+        Parameters:
+        - page: int, the top-10 page, starting from 1
+        - highlighted_rank: int, grid rank of the clicked cow, or None
+        - default_empty: bool, True to show the default image for the ranks
+          without a matched cow
+
+        Returns:
+        None
+        """
+        label_args = {}  # grid rank -> label arguments of the matched cow
+        rows = {}  # grid rank -> crop row of the tiles to make
+        jobs = []
+        size, overlay = self.tile_spec()
+        page_size = self.candidate_list.page_size
+        for Top_10_grid_rank, row in enumerate(self.candidate_list.page_rows(page), 1):
+            cow_rank = Top_10_grid_rank + page_size * (page - 1)
+            cow_id, distance, _, _, _, _, _ = self.candidate_list.rank(cow_rank)
+            if default_empty and cow_id == 0:
+                self.show_default_tile(Top_10_grid_rank)
+                continue
+            if Top_10_grid_rank == highlighted_rank:
+                background_color, relief = "#008000", "flat"
+            else:
+                background_color, relief = "#ECD9D9", "raised"
+            label_args[Top_10_grid_rank] = (
+                int(cow_id),
+                float(distance),
+                background_color,
+                relief,
+                cow_rank,
+            )
+
+            new_image = self.cached_tile(row, size, overlay)
+            if new_image is None:
+                rows[Top_10_grid_rank] = row
+                jobs.append(
+                    (Top_10_grid_rank, partial(self.make_tile, row, size, overlay))
                 )
-                new_photo = self.resize_and_center(
+                new_photo = self.placeholder_photo(Top_10_grid_rank, background_color)
+            else:
+                self.top_10_matched_cows_before_crop_image[Top_10_grid_rank] = new_image
+                new_photo = self.center_image(
                     new_image,
                     self.config.TOP10_FRAME_WIDTH,
                     self.config.TOP10_FRAME_HEIGHT,
+                    background_color,
+                    slot=Top_10_grid_rank,
                 )
+            self.Update_the_label_and_photo_for_top10_image(
+                Top_10_grid_rank, new_photo, *label_args[Top_10_grid_rank]
+            )
 
-                self.top_10_matched_cows_before_crop_image[Top_10_grid_rank] = new_image
-
-                self.Update_the_label_and_photo_for_top10_image(
-                    Top_10_grid_rank,
-                    new_photo,
-                    int(cow_id),
-                    float(distance),
-                    "#ECD9D9",
-                    "raised",
-                    cow_rank,
+        def show_tile(Top_10_grid_rank, new_image):
+            cow_id, distance, background_color, relief, cow_rank = label_args[
+                Top_10_grid_rank
+            ]
+            if new_image is None:
+                # The tile could not be made: show the no-photo image instead
+                new_image = fit_image(
+                    Image.open(self.config.SELECTED_COW_NO_PHOTO), size
                 )
             else:
-                # Show Default image
-                image_path = f"{self.config.TOP10_IMAGE_DIR_DEFAULT}/cow_0.jpg"
-
-                # Open and resize the image
-                image = Image.open(image_path)
-                new_photo = self.resize_and_center(
-                    image, self.config.TOP10_FRAME_WIDTH, self.config.TOP10_FRAME_HEIGHT
+                self.tile_prefetcher.put(
+                    self.tile_key(rows[Top_10_grid_rank], size, overlay), new_image
                 )
-                self.Update_the_label_and_photo_for_top10_image(
-                    Top_10_grid_rank, new_photo
+            self.top_10_matched_cows_before_crop_image[Top_10_grid_rank] = new_image
+            new_photo = self.center_image(
+                new_image,
+                self.config.TOP10_FRAME_WIDTH,
+                self.config.TOP10_FRAME_HEIGHT,
+                background_color,
+                slot=Top_10_grid_rank,
+            )
+            self.Update_the_label_and_photo_for_top10_image(
+                Top_10_grid_rank,
+                new_photo,
+                cow_id,
+                distance,
+                background_color,
+                relief,
+                cow_rank,
+            )
+
+        # Also drops the tiles still being made for the previous page
+        self.tile_loader.load(jobs, show_tile)
+
+    def prefetch_tiles(self, page):
+        """
+        Make the tiles the annotator is likely to see next in the background.
+
+        These are the other pages of the selected cow, then its candidates in
+        the neighbouring identification frames.
+
+        Parameters:
+        - page: int, the top-10 page on screen, starting from 1
+
+        Returns:
+        None
+        """
+        candidate_list = self.candidate_list
+        page_count = candidate_list.page_count
+        # The next pages first, the previous one last; empty ranks need no tile
+        rows = []
+        for i in range(1, page_count):
+            rows += candidate_list.page_rows((page - 1 + i) % page_count + 1)
+        rows = [row for row in rows if row != EMPTY_CROP_ROW]
+        target_frame = int(self.app_state.get_current_image_frame())
+        target_cow_tag = int(self.app_state.get_selected_cow())
+        confirmed_ids = [row[1] for row in self.app_state.get_saved_cows()]
+        # Taken now, for the whole round, in case the overlay is toggled during it
+        size, overlay = self.tile_spec()
+
+        def plan():
+            jobs = [
+                (
+                    self.tile_key(row, size, overlay),
+                    partial(self.load_tile, row, size, overlay),
                 )
+                for row in rows
+            ]
+            frame_candidates = [
+                candidate_list.frame_query(frame, target_cow_tag, confirmed_ids)
+                for frame in self.neighbour_frames(target_frame)
+            ]
+            # The first page of every neighbouring frame, then the next pages
+            for neighbour_page in range(1, page_count + 1):
+                for candidates in frame_candidates:
+                    for row in candidate_list.page_rows(neighbour_page, candidates):
+                        if row != EMPTY_CROP_ROW:
+                            jobs.append(
+                                (
+                                    self.tile_key(row, size, overlay),
+                                    partial(self.load_tile, row, size, overlay),
+                                )
+                            )
+            return jobs
+
+        self.tile_prefetcher.prefetch(plan)
+
+    def neighbour_frames(self, frame):
+        """
+        Get the identification frames around a frame, nearest first.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - frames: list, up to TilePrefetcher.neighbour_frames frames on each side
+        """
+        frame_keys = self.individual_identification_annotations.frame_keys
+        count = self.tile_prefetcher.neighbour_frames
+        after = int(np.searchsorted(frame_keys, frame, side="right"))
+        before = int(np.searchsorted(frame_keys, frame, side="left"))
+        frames = []
+        for i in range(count):
+            frames += frame_keys[after + i : after + i + 1].tolist()
+            frames += frame_keys[max(before - 1 - i, 0) : before - i].tolist()
+        return frames
+
+    def close(self):
+        # Drop the tiles still being made, and report how well prefetch did
+        self.tile_loader.close()
+        self.tile_prefetcher.close()
+        stats = self.tile_prefetcher.stats()
+        print(
+            f"Top-10 prefetch: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%}), {stats['prefetched']} tiles prefetched"
+        )
+
+    def placeholder_photo(self, slot, background_color):
+        # Blank tile shown until the tile of a rank has been made
+        background = self.photo_pool.background(
+            slot,
+            (self.config.TOP10_FRAME_WIDTH, self.config.TOP10_FRAME_HEIGHT),
+            background_color,
+        )
+        return self.photo_pool.photo(slot, background)
 
     def navigate_top10_cow(self, direction):
         top_10_cows_image_page = self.app_state.get_top_10_cows_image_page()
+        page_count = self.candidate_list.page_count
 
         if self.app_state.get_selected_cow() != None:
             if direction == "Next":
@@ -536,7 +789,7 @@ class TopkViewWindow:
                     "Clicked on Top 10 Next button, current page",
                     top_10_cows_image_page,
                 )
-                if top_10_cows_image_page == 3:
+                if top_10_cows_image_page >= page_count:
                     self.app_state.set_top_10_cows_image_page(1)
                 else:
                     self.app_state.add_top_10_cows_image_page()
@@ -546,62 +799,15 @@ class TopkViewWindow:
                     top_10_cows_image_page,
                 )
                 if top_10_cows_image_page == 1:
-                    self.app_state.set_top_10_cows_image_page(3)
+                    self.app_state.set_top_10_cows_image_page(page_count)
                 else:
                     self.app_state.subtract_top_10_cows_image_page()
 
             top_10_cows_image_page = self.app_state.get_top_10_cows_image_page()
-            self.top10_cow_number_photo.config(text=f"{top_10_cows_image_page}/3")
-
-            for Top_10_grid_rank in range(1, 11):
-                cow_rank = Top_10_grid_rank + 10 * (top_10_cows_image_page - 1)
-                (
-                    cow_id,
-                    distance,
-                    frame_number,
-                    x,
-                    y,
-                    w,
-                    h,
-                ) = self.top_10_matched_cows_info[cow_rank]
-                if cow_id != 0:
-                    # Crop and resize image
-                    new_image = self.crop_image(
-                        int(frame_number), 2, int(x), int(y), int(w), int(h)
-                    )
-                    new_photo = self.resize_and_center(
-                        new_image,
-                        self.config.TOP10_FRAME_WIDTH,
-                        self.config.TOP10_FRAME_HEIGHT,
-                    )
-
-                    self.top_10_matched_cows_before_crop_image[
-                        Top_10_grid_rank
-                    ] = new_image
-
-                    self.Update_the_label_and_photo_for_top10_image(
-                        Top_10_grid_rank,
-                        new_photo,
-                        int(cow_id),
-                        float(distance),
-                        "#ECD9D9",
-                        "raised",
-                        cow_rank,
-                    )
-                else:
-                    # Show Default image
-                    image_path = f"{self.config.TOP10_IMAGE_DIR_DEFAULT}/cow_0.jpg"
-
-                    # Open and resize the image
-                    image = Image.open(image_path)
-                    new_photo = self.resize_and_center(
-                        image,
-                        self.config.TOP10_FRAME_WIDTH,
-                        self.config.TOP10_FRAME_HEIGHT,
-                    )
-                    self.Update_the_label_and_photo_for_top10_image(
-                        Top_10_grid_rank, new_photo
-                    )
+            self.top10_cow_number_photo.config(
+                text=f"{top_10_cows_image_page}/{page_count}"
+            )
+            self.show_top10_page(top_10_cows_image_page, default_empty=True)
         else:
             self.time_tracker.record_button_press(
                 "Without selecting cow ID, Clicked on", direction
@@ -1,13 +1,31 @@
-import os
 import tkinter as tk
 import tkinter.font as tkFont
 
-from PIL import Image, ImageTk, ImageDraw
+from PIL import Image
+
+# Local imports
+from frame_prefetcher import FramePrefetcher
+from hit_test_index import HitTestIndex
+from photo_pool import PhotoImagePool
+from playback_scheduler import PlaybackScheduler
+from progressive_render import ProgressiveRender
+from render_coalescer import RenderCoalescer
+from scrub_frames import ScrubFrames
 
 
 class VideoPlayer:
     # Constants for original image dimensions
     ACTUAL_IMAGE_WIDTH, ACTUAL_IMAGE_HEIGHT = 1920, 1080
+    # Width of the main view
+    DISPLAY_IMAGE_WIDTH = 1200
+    # Line width of overlays, in original image pixels
+    OVERLAY_LINE_WIDTH = 8
+    # Overlay colors (canvas items have no alpha, so the lighter track
+    # shown while browsing multi-view frames is a lighter blue)
+    BOX_COLOR = "#FF0000"
+    SAVED_BOX_COLOR = "#008000"
+    TRACK_COLOR = "#0000FF"
+    MULTI_VIEW_TRACK_COLOR = "#7F7FFF"
 
     def __init__(
         self,
@@ -17,10 +35,13 @@ class VideoPlayer:
         annotations,
         individual_cow_annotations,
         nearest_bbox_per_cow,
+        annotation_store,
         show_all_windows,
         save_all_histories_and_ids,
         app_state,
         time_tracker,
+        frame_cache,
+        frame_catalog,
     ):
         self.root = root
         # Local import
@@ -33,39 +54,75 @@ class VideoPlayer:
         self.save_all_histories_and_ids = save_all_histories_and_ids
         self.app_state = app_state
         self.time_tracker = time_tracker
-        self.video_timer = None
         self.play_state = False
-        self.bounding_boxes = {}
+        self.hit_test_index = HitTestIndex(annotation_store)
         self.eval_cow = []
 
-        self.image_files = self.get_sorted_image_files(self.config.IMAGE_DIR)
+        self.image_files = frame_catalog.frames(self.config.IMAGE_DIR)
+        self.image_base_width = self.DISPLAY_IMAGE_WIDTH
+        # Scale from original image to display coordinates
+        self.display_scale = self.image_base_width / self.ACTUAL_IMAGE_WIDTH
+        # Frame step of the last navigation, to prefetch in that direction
+        self.frame_step = 1
+        # What is on the canvas: frame image, box items and track items
+        self.shown_frame = None
+        self.box_state = None
+        self.track_state = None
+        self.image_base_height = round(self.ACTUAL_IMAGE_HEIGHT * self.display_scale)
+        self.frame_prefetcher = FramePrefetcher(
+            self.image_files,
+            frame_cache,
+            (self.image_base_width, self.image_base_height),
+            depth=getattr(self.config, "PREFETCH_DEPTH", FramePrefetcher.DEFAULT_DEPTH),
+        )
+        # One render per idle cycle for slider drags and auto-repeated keys
+        self.render_coalescer = RenderCoalescer(self.root, self.show_all_windows)
+        # Pre-downscaled frames shown while dragging the slider, if built
+        scrub_width = getattr(self.config, "SCRUB_WIDTH", ScrubFrames.DEFAULT_WIDTH)
+        scrub_size = (
+            scrub_width,
+            round(scrub_width * self.ACTUAL_IMAGE_HEIGHT / self.ACTUAL_IMAGE_WIDTH),
+        )
+        self.scrub_frames = ScrubFrames.load(
+            self.config.IMAGE_DIR, scrub_size, len(self.image_files)
+        )
+        self.scrub_coalescer = RenderCoalescer(self.root, self.show_scrub_frame)
+        # Quick previews of frames that are not decoded yet, then the frame
+        self.progressive_render = ProgressiveRender(self.root)
+        # The displayed frame, one PhotoImage updated in place
+        self.photo_pool = PhotoImagePool()
+        self.photo = None
+        self.scrubbing = False
+        self.playback = PlaybackScheduler(
+            self.root,
+            self.app_state.get_current_image_frame,
+            self.play_frame,
+            self.frame_prefetcher.is_ready,
+            len(self.image_files) - 1,
+            self.finish_video,
+            fps=getattr(self.config, "PLAYBACK_FPS", PlaybackScheduler.DEFAULT_FPS),
+        )
         self.setup_video_player(
             left_canvas, self.config.IMAGE_DIR, self.config.DATABASE_IMAGE_DIR
         )
 
-    def get_sorted_image_files(self, directory):
-        # Get a list of all image files in the directory
-        image_files = [
-            os.path.join(directory, f)
-            for f in os.listdir(directory)
-            if f.endswith(".jpg")
-        ]
-        # Sort the images by filename
-        image_files = sorted(image_files)
-        # Insert a dummy element at the beginning to make the index start from 1
-        image_files.insert(0, None)
-        return image_files
-
     def setup_video_player(self, left_canvas, image_dir, database_image_dir):
         self.video_canvas = tk.Frame(left_canvas)
         self.video_canvas.pack(side=tk.TOP, fill=tk.BOTH)
 
         self.app_state.set_current_image_frame(1)  # frame_number_start_with_0
 
-        self.image_label = tk.Label(self.video_canvas)
-        self.image_label.bind("<Button-1>", self.on_canvas_click)
-        self.image_label.pack(side=tk.TOP)
-        self.image_label.focus_set()  # Set focus to the image_label widget
+        # Frame image item, with overlay items tagged "bbox" and "track" on top
+        self.image_canvas = tk.Canvas(
+            self.video_canvas,
+            width=self.image_base_width,
+            height=self.image_base_height,
+            highlightthickness=0,
+        )
+        self.image_canvas.bind("<Button-1>", self.on_canvas_click)
+        self.image_canvas.pack(side=tk.TOP)
+        self.image_canvas.focus_set()  # Set focus to the image_canvas widget
+        self.frame_item = self.image_canvas.create_image(0, 0, anchor=tk.NW)
 
         ##Video controller
         video_controller = tk.Frame(self.video_canvas)
@@ -85,7 +142,8 @@ class VideoPlayer:
 
         # Event bindings
         self.seek_canvas.bind("<Button-1>", self.handle_slider_click)
-        self.seek_canvas.bind("<B1-Motion>", self.handle_slider_click)
+        self.seek_canvas.bind("<B1-Motion>", self.handle_slider_drag)
+        self.seek_canvas.bind("<ButtonRelease-1>", self.handle_slider_release)
 
         # Play/pause and next frame buttons frame
         controls_frame = tk.Frame(video_controller)
@@ -117,40 +175,41 @@ class VideoPlayer:
         )
         self.timecode_label.pack(side=tk.LEFT)
 
-    def resize_to_aspect_ratio(self, img, aspect_ratio):
+        # Playback speed label
+        self.speed_label = tk.Label(
+            video_controller, text=self.speed_text(), font=customFont, padx=10
+        )
+        self.speed_label.pack(side=tk.LEFT)
+
+    def play_video(self):
         """
-        Resize an image while maintaining a given aspect ratio.
+        Play a video from the current frame at the current speed.
 
         Parameters:
-        - img: PIL Image object
-        - aspect_ratio: float, desired aspect ratio (width/height)
+        None
 
         Returns:
-        - resized_img: PIL Image object, resized image
+        None
         """
-        width, height = img.size
-        new_height = round(width / aspect_ratio)
-
-        if new_height > height:
-            new_width = round(height * aspect_ratio)
-            new_height = height
-        else:
-            new_width = width
-
-        return img.resize((new_width, new_height), Image.ANTIALIAS)
+        current_image_frame = self.app_state.get_current_image_frame()
+        # Decode ahead in the play direction
+        self.frame_step = 1
+        self.frame_prefetcher.prefetch(current_image_frame, self.frame_step)
+        self.playback.start(current_image_frame)
 
-    def play_video(self):
+    def play_frame(self, frame):
         """
-        Play a video and deselect any selected cow.
+        Show a frame picked by the playback scheduler.
 
         Parameters:
-        None
+        - frame: int, the frame number
 
         Returns:
         None
         """
-        self.change_image("next")
-        self.video_timer = self.root.after(1000, self.play_video)
+        self.update_slider(frame)
+        self.show_all_windows()
+        self.time_tracker.record_image_change(frame)
 
     def pause_video(self):
         """
@@ -162,9 +221,43 @@ class VideoPlayer:
         Returns:
         None
         """
-        if self.video_timer:
-            self.root.after_cancel(self.video_timer)
-            self.video_timer = None
+        self.playback.stop()
+        stats = self.playback.stats()
+        print(
+            f"Playback: {stats['achieved_fps']:.2f} fps "
+            f"(target {stats['target_fps']:.2f} fps), "
+            f"{stats['shown_frames']} frames shown, "
+            f"{stats['dropped_frames']} dropped"
+        )
+        stats = self.frame_prefetcher.stats()
+        print(
+            f"Frame prefetch: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%})"
+        )
+
+    def finish_video(self):
+        # Playback reached the last frame
+        self.play_canvas.delete("all")
+        self.play_canvas.create_polygon(5, 5, 5, 25, 25, 15, fill="black")
+        self.pause_video()
+        self.play_state = False
+
+    def speed_text(self):
+        return f"{self.playback.speed:g}x"
+
+    def change_playback_speed(self, steps):
+        """
+        Change the playback speed.
+
+        Parameters:
+        - steps: int, +1 for the next faster speed, -1 for the next slower one
+
+        Returns:
+        None
+        """
+        speed = self.playback.change_speed(steps)
+        self.speed_label.config(text=self.speed_text())
+        self.time_tracker.record_button_press("Playback speed", speed)
 
     def toggle_video(self):
         """
@@ -226,154 +319,146 @@ class VideoPlayer:
         minutes, seconds = divmod(current_image_frame, 60)
         self.timecode_label.config(text=f"{minutes:02}:{seconds:02}")
 
-    def draw_rectangle(
-        self, draw, x1, y1, x2, y2, r, g, b, line_opacity=255, line_width=8
-    ):
+    def draw_rectangle(self, x1, y1, x2, y2, color, tags, line_width=8):
         """
         Draw a rectangle on the canvas.
 
         Parameters:
-        None
+        - x1, y1, x2, y2: float, the corners in canvas coordinates
+        - color: str, the outline color
+        - tags: str or tuple, the canvas tags of the item
 
         Returns:
         None
         """
-        draw.rectangle(
-            [(int(x1), int(y1)), (int(x2), int(y2))],
-            outline=(r, g, b, line_opacity),
+        self.image_canvas.create_rectangle(
+            int(x1),
+            int(y1),
+            int(x2),
+            int(y2),
+            outline=color,
             width=line_width,
+            tags=tags,
         )
 
-    def draw_bounding_boxes(self, img):
+    def draw_box(self, x, y, w, h, color, tags="bbox"):
         """
-        Draw bounding boxes on the image based on the current frame's annotations.
+        Draw a bounding box given in original image coordinates on the canvas.
 
         Parameters:
-        - img: PIL Image object
+        - x, y, w, h: float, the bounding box in original image pixels
+        - color: str, the outline color
+        - tags: str or tuple, the canvas tags of the item
 
         Returns:
-        - img: PIL Image object, image with bounding boxes drawn
+        None
+        """
+        scale = self.display_scale
+        self.draw_rectangle(
+            x * scale,
+            y * scale,
+            (x + w) * scale,
+            (y + h) * scale,
+            color,
+            tags,
+            line_width=max(1, round(self.OVERLAY_LINE_WIDTH * scale)),
+        )
+
+    def draw_bounding_boxes(self):
+        """
+        Draw bounding boxes on the canvas based on the current frame's annotations.
+
+        Parameters:
+        None
+
+        Returns:
+        None
         """
         current_image_frame = self.app_state.get_current_image_frame()
-        draw = ImageDraw.Draw(img, "RGBA")
+        self.image_canvas.delete("bbox")
         if current_image_frame in self.annotations:
-            # Initialize the bounding_boxes list for this frame
-            self.bounding_boxes[current_image_frame] = []
             for annotation in self.annotations[current_image_frame]:
                 id, x, y, w, h, camera_num = annotation
                 evaluation_mode = self.app_state.get_evaluation_mode()
                 if evaluation_mode == True:
                     eval_cow = self.app_state.get_eval_cow()
-                    if int(id) in eval_cow:
-                        # Check if the id matches any saved cows
-                        saved_cows = self.app_state.get_saved_cows()
-                        matching_rows = [row for row in saved_cows if row[0] == id]
-                        if len(matching_rows) > 0:
-                            self.draw_rectangle(
-                                draw, int(x), int(y), int(x + w), int(y + h), 0, 128, 0
-                            )  # mid-range green
-                            # Draw the cow's id in yellow
-                            id = int(id)
-                            text = str(int(matching_rows[0][1]))
-                            text_position = (int(x), int(y))
-                            draw.text(text_position, text, fill="yellow")
-                        else:
-                            self.draw_rectangle(
-                                draw, int(x), int(y), int(x + w), int(y + h), 255, 0, 0
-                            )  # red
-                            # Store bounding box coordinates along with id in self.bounding_boxes
-                            self.bounding_boxes[current_image_frame].append(
-                                (x, y, x + w, y + h, id, camera_num)
-                            )
-
+                    if int(id) not in eval_cow:
+                        continue
+                # Check if the id matches any saved cows
+                saved_cows = self.app_state.get_saved_cows()
+                matching_rows = [row for row in saved_cows if row[0] == id]
+                if len(matching_rows) > 0:
+                    self.draw_box(x, y, w, h, self.SAVED_BOX_COLOR)
+                    # Draw the cow's id in yellow
+                    text = str(int(matching_rows[0][1]))
+                    self.image_canvas.create_text(
+                        int(x * self.display_scale),
+                        int(y * self.display_scale),
+                        text=text,
+                        fill="yellow",
+                        anchor=tk.NW,
+                        tags="bbox",
+                    )
                 else:
-                    # Check if the id matches any saved cows
-                    saved_cows = self.app_state.get_saved_cows()
-                    matching_rows = [row for row in saved_cows if row[0] == id]
-                    if len(matching_rows) > 0:
-                        self.draw_rectangle(
-                            draw, int(x), int(y), int(x + w), int(y + h), 0, 128, 0
-                        )  # mid-range green
-                        # Draw the cow's id in yellow
-                        id = int(id)
-                        text = str(int(matching_rows[0][1]))
-                        text_position = (int(x), int(y))
-                        draw.text(text_position, text, fill="yellow")
-                    else:
-                        self.draw_rectangle(
-                            draw, int(x), int(y), int(x + w), int(y + h), 255, 0, 0
-                        )  # red
-                        # Store bounding box coordinates along with id in self.bounding_boxes
-                        self.bounding_boxes[current_image_frame].append(
-                            (x, y, x + w, y + h, id, camera_num)
-                        )
-
-        return img
-
-    def draw_bounding_boxes_for_selected_cow(self, img):
-        """
-        Draw the tracks of the selected cow and original frame on the given image.
+                    self.draw_box(x, y, w, h, self.BOX_COLOR)
+
+    def draw_bounding_boxes_for_selected_cow(self):
+        """
+        Draw the bounding box of the selected cow in the current frame.
 
         Parameters:
-        - img: PIL Image object
+        None
 
         Returns:
-        - img: PIL Image object with tracks drawn
+        None
         """
         current_image_frame = self.app_state.get_current_image_frame()
-        draw = ImageDraw.Draw(img, "RGBA")
+        self.image_canvas.delete("bbox")
         selected_cow = self.app_state.get_selected_cow()
         if selected_cow in self.individual_cow_annotations:
-            for frame, (
-                size,
-                bbox,
-            ) in self.nearest_bbox_per_cow[selected_cow].items():
+            track = self.nearest_bbox_per_cow[selected_cow]
+            if current_image_frame in track:
+                size, bbox = track[current_image_frame]
                 x, y, w, h = bbox
-                # Original Cow
-                multi_view_original = self.app_state.get_multi_view_original()
-                # if frame == multi_view_original:
-                #     self.draw_rectangle(
-                #         draw, int(x), int(y), int(x + w), int(y + h), 255, 0, 0
-                #     )  # red
-                if frame == current_image_frame:
-                    self.draw_rectangle(
-                        draw, int(x), int(y), int(x + w), int(y + h), 255, 0, 0
-                    )  # blue
-        return img
-
-    def draw_tracks_of_selected_cow(self, img, line_opacity=190):
-        """
-        Draw the tracks of the selected cow on the given image.
+                self.draw_box(x, y, w, h, self.BOX_COLOR)
+
+    def draw_tracks_of_selected_cow(self, color=TRACK_COLOR):
+        """
+        Draw the tracks of the selected cow on the canvas.
+
+        The track does not depend on the frame, so its item stays on the
+        canvas while stepping through frames.
 
         Parameters:
-        - img: PIL Image object
+        - color: str, the color of the track
 
         Returns:
-        - img: PIL Image object with tracks drawn
+        None
         """
-        draw = ImageDraw.Draw(img, "RGBA")
+        self.image_canvas.delete("track")
         selected_cow = self.app_state.get_selected_cow()
         if selected_cow in self.individual_cow_annotations:
-            middle_points = []  # Initialize the list to hold middle pointså
+            middle_points = []  # Initialize the list to hold middle points
             # Extract middle points of the largest bounding boxes
             for frame, (
                 size,
                 bbox,
             ) in self.nearest_bbox_per_cow[selected_cow].items():
                 x, y, w, h = bbox
-                middle_x = x + w / 2
-                middle_y = y + h / 2
-                middle_points.append((middle_x, middle_y))
-
-            # Draw lines between middle points to form the track
-            for i in range(len(middle_points) - 1):
-                draw.line(
-                    [middle_points[i], middle_points[i + 1]],
-                    fill=(0, 0, 255, line_opacity),
-                    width=8,
+                middle_points.append((x + w / 2) * self.display_scale)
+                middle_points.append((y + h / 2) * self.display_scale)
+
+            # Draw one line through the middle points to form the track
+            if len(middle_points) >= 4:
+                self.image_canvas.create_line(
+                    *middle_points,
+                    fill=color,
+                    width=max(1, round(self.OVERLAY_LINE_WIDTH * self.display_scale)),
+                    joinstyle=tk.ROUND,
+                    tags="track",
                 )
-
-        return img
+                # Keep the track under the bounding boxes
+                self.image_canvas.tag_raise("bbox")
 
     def on_canvas_click(self, event, *args):
         """
@@ -401,82 +486,152 @@ class VideoPlayer:
 
         selected_cow = self.app_state.get_selected_cow()
         if selected_cow == None:
-            # Loop through all bounding boxes in the current frame
-            for x1, y1, x2, y2, box_id, camera_num in self.bounding_boxes.get(
-                current_image_frame, []
-            ):
-                if x1 <= x <= x2 and y1 <= y <= y2:
-                    box_id = int(box_id)
-                    self.time_tracker.record_button_press(
-                        "Clicked on query cow ",
-                        box_id,
-                    )
+            # Topmost red (selectable) bounding box under the click
+            box = self.hit_test_index.hit(
+                current_image_frame, x, y, self.is_selectable_cow
+            )
+            if box is not None:
+                box_id = int(box["cow_tag"])
+                self.time_tracker.record_button_press(
+                    "Clicked on query cow ",
+                    box_id,
+                )
 
-                    self.app_state.set_selected_cow(int(box_id))
-                    selected_cow = self.app_state.get_selected_cow()
-                    self.time_tracker.start_or_resume_timer(selected_cow)
-                    self.show_all_windows()
-                    break
+                self.app_state.set_selected_cow(int(box_id))
+                selected_cow = self.app_state.get_selected_cow()
+                self.time_tracker.start_or_resume_timer(selected_cow)
+                self.show_all_windows()
         else:
-            # If a cow is already selected, draw tracks and bounding boxes
-            if selected_cow in self.individual_cow_annotations:
-                for annotation in self.individual_cow_annotations[selected_cow]:
-                    frame, x1, y1, w, h, camera_num, transform_dimensions = annotation
-                    selected_frame = 0
-                    x2 = x1 + w
-                    y2 = y1 + h
-                    multi_view_original = self.app_state.get_multi_view_original()
-                    if frame == multi_view_original:
-                        print(f"Select:{frame} ")
-                        if x1 <= x <= x2 and y1 <= y <= y2:
-                            self.app_state.set_current_image_frame(multi_view_original)
-
-                            self.show_all_windows()
-                            self.change_image_by_frame(frame)
-
-                            minutes, seconds = divmod(frame, 60)
-                            self.timecode_label.config(
-                                text=f"{minutes:02}:{seconds:02}"
-                            )
+            # If a cow is already selected, look up its box in the original frame
+            multi_view_original = self.app_state.get_multi_view_original()
+            if multi_view_original is not None:
+                box = self.hit_test_index.hit(
+                    multi_view_original, x, y, lambda cow_tag: cow_tag == selected_cow
+                )
+                if box is not None:
+                    frame = multi_view_original
+                    print(f"Select:{frame} ")
+                    self.app_state.set_current_image_frame(multi_view_original)
 
-    def load_image(self):
-        # Load the image
+                    self.show_all_windows()
+                    self.change_image_by_frame(frame)
+
+                    minutes, seconds = divmod(frame, 60)
+                    self.timecode_label.config(text=f"{minutes:02}:{seconds:02}")
+
+    def is_selectable_cow(self, cow_tag):
+        """
+        Check whether a cow's box is drawn in red and can be clicked.
+
+        Parameters:
+        - cow_tag: int, the cow tag
+
+        Returns:
+        - bool, True if the cow has no confirmed ID (and is evaluated, in evaluation mode)
+        """
+        if self.app_state.get_evaluation_mode() == True:
+            if cow_tag not in self.app_state.get_eval_cow():
+                return False
+        saved_cows = self.app_state.get_saved_cows()
+        return not any(row[0] == cow_tag for row in saved_cows)
+
+    def show_frame(self):
+        """
+        Show the current frame in the canvas image item, if it is not shown yet.
+
+        A frame that is not decoded yet is shown as a quick preview first and
+        replaced once it is decoded, unless the user has moved on by then.
+
+        Parameters:
+        None
+
+        Returns:
+        None
+        """
         current_image_frame = self.app_state.get_current_image_frame()
-        img_path = self.image_files[current_image_frame]
-        img = Image.open(img_path)
-        img = self.draw_bounding_boxes(img)  # draw_annotation_data
-
-        # Resize the image to a maximum width of 600 pixels while maintaining the aspect ratio
-        self.image_base_width = 1200
-        w_percent = self.image_base_width / float(img.width)
-        h_size = int(float(img.height) * float(w_percent))
-        img = img.resize((self.image_base_width, h_size), Image.LANCZOS)
-        self.photo = ImageTk.PhotoImage(img)
-        self.image_label.config(image=self.photo)
+        if current_image_frame == self.shown_frame:
+            return
+        self.shown_frame = current_image_frame
+        if self.frame_prefetcher.is_ready(current_image_frame):
+            self.progressive_render.cancel()
+            self.show_full_frame(current_image_frame)
+            self.frame_prefetcher.prefetch(current_image_frame, self.frame_step)
+            return
+
+        # Decode the frame in the background while its preview is shown
+        self.frame_prefetcher.prefetch(current_image_frame, self.frame_step)
+        self.progressive_render.render(
+            lambda: self.show_image(self.preview_frame(current_image_frame)),
+            lambda: self.show_full_frame(current_image_frame),
+        )
+
+    def show_full_frame(self, frame):
+        # Full-quality pass, unless another frame has been shown since
+        if frame == self.shown_frame:
+            self.show_image(self.frame_prefetcher.get(frame))
+
+    def show_image(self, img):
+        # The frame PhotoImage is updated in place; only a new one is set
+        photo = self.photo_pool.photo("frame", img)
+        if photo is not self.photo:
+            self.photo = photo
+            self.image_canvas.itemconfig(self.frame_item, image=self.photo)
+
+    def preview_frame(self, frame):
+        """
+        Get a quick, low-quality display-size image of a frame.
+
+        Parameters:
+        - frame: int, the frame number
+
+        Returns:
+        - img: PIL Image object, from the scrub frames if they are built
+        """
+        if self.scrub_frames is not None:
+            return self.scrub_frames.image(frame).resize(
+                (self.image_base_width, self.image_base_height), Image.BILINEAR
+            )
+        return self.frame_prefetcher.preview(frame)
+
+    def load_image(self):
+        self.show_frame()
+        if self.track_state is not None:
+            self.image_canvas.delete("track")
+            self.track_state = None
+
+        # Saved cows are only ever appended, so their count identifies the list
+        box_state = (
+            "bounding_boxes",
+            self.app_state.get_current_image_frame(),
+            len(self.app_state.get_saved_cows()),
+            self.app_state.get_evaluation_mode(),
+        )
+        if box_state != self.box_state:
+            self.draw_bounding_boxes()  # draw_annotation_data
+            self.box_state = box_state
 
     def load_and_draw_cow_image(self):
-        # Load the image
-        current_image_frame = self.app_state.get_current_image_frame()
-        img_path = self.image_files[current_image_frame]
-        img = Image.open(img_path)
+        self.show_frame()
+        selected_cow = self.app_state.get_selected_cow()
+
         multi_view_original = self.app_state.get_multi_view_original()
         if multi_view_original:
-            img = self.draw_tracks_of_selected_cow(img, 128)
+            track_color = self.MULTI_VIEW_TRACK_COLOR
         else:
-            print("test execute load_and_draw_cow_image")
-            img = self.draw_tracks_of_selected_cow(img, 190)  # draw_annotation_data
-        img = self.draw_bounding_boxes_for_selected_cow(img)  # draw_annotation_data
-
-        # Resize the image to fit a 16:9 aspect ratio
-        img = self.resize_to_aspect_ratio(img, 16 / 9)
-
-        # Resize the image to a maximum width of 600 pixels while maintaining the aspect ratio
-        base_width = 1200
-        w_percent = self.image_base_width / float(img.width)
-        h_size = int(float(img.height) * float(w_percent))
-        img = img.resize((self.image_base_width, h_size), Image.ANTIALIAS)
-        self.photo = ImageTk.PhotoImage(img)
-        self.image_label.config(image=self.photo)
+            track_color = self.TRACK_COLOR
+        track_state = (selected_cow, track_color)
+        if track_state != self.track_state:
+            self.draw_tracks_of_selected_cow(track_color)  # draw_annotation_data
+            self.track_state = track_state
+
+        box_state = (
+            "selected_cow",
+            self.app_state.get_current_image_frame(),
+            selected_cow,
+        )
+        if box_state != self.box_state:
+            self.draw_bounding_boxes_for_selected_cow()  # draw_annotation_data
+            self.box_state = box_state
 
     def handle_slider_click(self, event):
         """
@@ -496,8 +651,63 @@ class VideoPlayer:
 
         self.time_tracker.record_button_press("Slider clicked at", int(original_x))
 
-        selected_cow = self.app_state.get_selected_cow()
-        self.show_all_windows()
+        self.render_coalescer.request()
+
+    def handle_slider_drag(self, event):
+        """
+        Handle the slider drag event, showing scrub frames if they are built.
+
+        Parameters:
+        - event: tkinter Event object
+
+        Returns:
+        None
+        """
+        if self.scrub_frames is None:
+            self.handle_slider_click(event)
+            return
+
+        original_x = (event.x / 1200) * (len(self.image_files) - 2)
+        self.update_slider(original_x)
+        self.time_tracker.record_button_press("Slider clicked at", int(original_x))
+
+        # Only the scrub frame follows the drag; the panes update on release
+        self.render_coalescer.cancel()
+        self.scrubbing = True
+        self.scrub_coalescer.request()
+
+    def handle_slider_release(self, event):
+        """
+        Handle the slider release event, showing the full-quality frame after a scrub.
+
+        Parameters:
+        - event: tkinter Event object
+
+        Returns:
+        None
+        """
+        if self.scrubbing:
+            self.scrubbing = False
+            self.scrub_coalescer.cancel()
+            self.render_coalescer.request()
+
+    def show_scrub_frame(self):
+        """
+        Show the scrub frame of the current frame, without overlays.
+
+        Parameters:
+        None
+
+        Returns:
+        None
+        """
+        current_image_frame = self.app_state.get_current_image_frame()
+        self.progressive_render.cancel()
+        self.show_image(self.preview_frame(current_image_frame))
+        # Boxes belong to another frame: redraw everything on release
+        self.image_canvas.delete("bbox")
+        self.shown_frame = None
+        self.box_state = None
 
     def change_image(self, direction):
         """
@@ -511,12 +721,14 @@ class VideoPlayer:
         """
         if direction == "next":
             # Go to the next image
+            self.frame_step = 1
             self.app_state.add_current_image_frame()
             current_image_frame = self.app_state.get_current_image_frame()
             if current_image_frame > len(self.image_files) - 1:
                 self.app_state.set_current_image_frame(len(self.image_files) - 1)
         elif direction == "previous":
             # Go to the previous image
+            self.frame_step = -1
             self.app_state.subtract_current_image_frame()
             current_image_frame = self.app_state.get_current_image_frame()
             if current_image_frame <= 1:
@@ -524,7 +736,7 @@ class VideoPlayer:
 
         current_image_frame = self.app_state.get_current_image_frame()
         self.update_slider(current_image_frame)
-        self.show_all_windows()
+        self.render_coalescer.request()
         self.time_tracker.record_image_change(current_image_frame)
 
     def change_image_10(self, direction):
@@ -539,12 +751,14 @@ class VideoPlayer:
         """
         if direction == "next":
             # Go to the next image
+            self.frame_step = 10
             self.app_state.add_ten_to_current_image_frame()
             current_image_frame = self.app_state.get_current_image_frame()
             if current_image_frame > len(self.image_files) - 1:
                 self.app_state.set_current_image_frame(len(self.image_files) - 1)
         elif direction == "previous":
             # Go to the previous image
+            self.frame_step = -10
             self.app_state.subtract_ten_to_current_image_frame()
             current_image_frame = self.app_state.get_current_image_frame()
             if current_image_frame <= 1:
@@ -552,7 +766,7 @@ class VideoPlayer:
 
         current_image_frame = self.app_state.get_current_image_frame()
         self.update_slider(current_image_frame)
-        self.show_all_windows()
+        self.render_coalescer.request()
         self.time_tracker.record_image_change(current_image_frame)
 
     def change_image_by_frame(self, frame):
@@ -569,3 +783,11 @@ class VideoPlayer:
         current_image_frame = self.app_state.get_current_image_frame()
         self.update_slider(current_image_frame)
         self.show_all_windows()
+
+    def close(self):
+        # Stop playback and drop the renders and frames still queued
+        self.playback.stop()
+        self.render_coalescer.cancel()
+        self.scrub_coalescer.cancel()
+        self.progressive_render.cancel()
+        self.frame_prefetcher.close()